@@ -6,7 +6,7 @@ from pathlib import Path
 from typing import Any
 
 from models import Equipment, PackagingRule, chargeable_air_weight_kg, estimate_equipment_count, rounded_order_packs
-from rate_engine import RateTestInput, compute_rate_total, select_best_rate_card
+from rate_engine import RateTestInput, compute_rate_total, index_charges, index_rate_cards, select_best_rate_card, shipment_lane_key
 
 
 DATA_DIR = Path(__file__).resolve().parent / "scenario_data"
@@ -70,6 +70,7 @@ def run_acceptance_pipeline() -> dict[str, Any]:
         }
         for r in _read_csv("rate_cards.csv")
     ]
+    cards_by_lane = index_rate_cards(rate_cards)
     rate_charges = [
         {
             "rate_card_id": int(r["rate_card_id"]),
@@ -85,6 +86,7 @@ def run_acceptance_pipeline() -> dict[str, Any]:
         }
         for r in _read_csv("rate_charges.csv")
     ]
+    charges_by_card = index_charges(rate_charges)
     customs = {(r["part_number"], r["supplier_code"]): r for r in _read_csv("customs.csv")}
     equipment_rows = _read_csv("equipment.csv")
     eq_by_mode = {
@@ -153,10 +155,10 @@ def run_acceptance_pipeline() -> dict[str, Any]:
             containers_count=intl_count,
             chargeable_weight_kg=chargeable_weight,
         )
-        intl_card = select_best_rate_card(rate_cards, intl_shipment)
+        intl_card = select_best_rate_card(cards_by_lane.get(shipment_lane_key(intl_shipment), []), intl_shipment)
         if intl_card is None:
             raise AssertionError(f"No international rate card for {phase_name} {default_mode} {intl_scope}")
-        intl_result = compute_rate_total(intl_card, rate_charges, intl_shipment)
+        intl_result = compute_rate_total(intl_card, charges_by_card.get(int(intl_card["id"]), []), intl_shipment)
 
         domestic_equipment = eq_by_mode["TRUCK"]
         truck_count = float(estimate_equipment_count(total_volume, gross_weight, domestic_equipment))
@@ -174,10 +176,10 @@ def run_acceptance_pipeline() -> dict[str, Any]:
             volume_m3=total_volume,
             containers_count=truck_count,
         )
-        dom_card = select_best_rate_card(rate_cards, dom_shipment)
+        dom_card = select_best_rate_card(cards_by_lane.get(shipment_lane_key(dom_shipment), []), dom_shipment)
         if dom_card is None:
             raise AssertionError(f"No domestic rate card for {phase_name}")
-        dom_result = compute_rate_total(dom_card, rate_charges, dom_shipment)
+        dom_result = compute_rate_total(dom_card, charges_by_card.get(int(dom_card["id"]), []), dom_shipment)
 
         total_cost = intl_result["grand_total"] + dom_result["grand_total"]
         shipment_plan.append(
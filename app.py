@@ -23,7 +23,7 @@ from db import (
     get_conn,
     import_data_bundle,
     purge_demand_before,
-    run_migrations,
+    ensure_migrated,
     upsert_rows,
     vacuum_db,
     map_import_demand_rows,
@@ -31,7 +31,7 @@ from db import (
     normalize_pack_dimension_to_meters,
 )
 from models import Equipment, PackagingRule
-from planner import allocate_tranches, build_shipments, recommend_modes, customs_report, phase_cost_rollup, norm_mode
+from planner import allocate_tranches, build_shipments, recommend_modes, customs_report, phase_cost_rollup, norm_mode, normalize_phase_defaults, phase_key
 from rate_engine import RateTestInput, compute_rate_total, select_best_rate_card
 from services.master_data_import import (
     _normalize_import,
@@ -39,11 +39,11 @@ from services.master_data_import import (
     validate_pack_master_import,
 )
 from seed import TEMPLATE_SPECS, ensure_templates, seed_if_empty
-from field_specs import TABLE_SPECS, build_help_text, field_guide_df, table_column_config
+from field_specs import DEMAND_IMPORT_REQUIRED, TABLE_SPECS, build_help_text, field_guide_df, table_column_config
 from validators import require_cols, validate_dates, validate_positive, validate_with_specs
 
 st.set_page_config(page_title="Logistics Planner", layout="wide")
-run_migrations()
+ensure_migrated()
 seed_if_empty()
 ensure_templates()
 
@@ -160,7 +160,7 @@ def render_template_downloads(prefix: str = "tpl") -> None:
 
 
 def apply_demand_import(import_frame: pd.DataFrame, supplier_key: str = "import_supplier_map") -> tuple[bool, str]:
-    required_import_cols = [name for name, spec in TABLE_SPECS["demand_import"].items() if spec.required]
+    required_import_cols = DEMAND_IMPORT_REQUIRED
     missing_required = [col for col in required_import_cols if col not in import_frame.columns]
     if missing_required:
         return False, "Demand import is missing required columns: " + ", ".join(missing_required)
@@ -1066,7 +1066,7 @@ Example: CN + OCEAN = 35 days.""")
             imported_edit = st.data_editor(imported, num_rows="dynamic", width="stretch")
             if st.button("Append imported rows"):
                 import_frame = imported_edit.copy()
-                required_import_cols = [name for name, spec in TABLE_SPECS["demand_import"].items() if spec.required]
+                required_import_cols = DEMAND_IMPORT_REQUIRED
                 missing_required = [col for col in required_import_cols if col not in import_frame.columns]
                 if missing_required:
                     st.error(
@@ -1345,7 +1345,7 @@ elif section == "Planner":
                 need_date=pd.to_datetime(d["need_date"]).date(),
                 sku_id=int(d["sku_id"]),
             )
-            st.dataframe(pd.DataFrame([r.__dict__ for r in rows]), width="stretch")
+            st.dataframe(pd.DataFrame(rows), width="stretch")
 
     with rec_tab:
         render_about("Recommendations", "Calculate mode recommendations from lead times, equipment, and advanced rate cards.")
@@ -1387,12 +1387,13 @@ elif section == "Planner":
 
                 lead_tbl = {(str(r["country_of_origin"]).strip().upper(), norm_mode(r["mode"])): int(r["lead_days"]) for _, r in lead.iterrows()}
                 sku_ov = {(int(r["sku_id"]), norm_mode(r["mode"])): int(r["lead_days"]) for _, r in lead_ov.iterrows()}
-                phase_cfg = {r["phase"]: r for _, r in phase_defaults.iterrows()} if not phase_defaults.empty else {}
+                phase_cfg = normalize_phase_defaults(phase_defaults.to_dict("records"))
+                demand_phase = phase_key(d.get("phase"))
                 lanes = read_table("lanes")
                 route_info = None
                 sku_row = skus[skus["sku_id"] == d["sku_id"]].iloc[0]
                 lane_match = lanes[(lanes["origin_code"] == sku_row["supplier_code"]) & (lanes["dest_code"] == sku_row["plant_code"])] if not lanes.empty else pd.DataFrame()
-                service_scope = str(d.get("service_scope") or phase_cfg.get(str(d.get("phase") or ""), {}).get("default_service_scope") or "P2P")
+                service_scope = str(d.get("service_scope") or phase_cfg.get(demand_phase, {}).get("default_service_scope") or "P2P")
                 miles = float(d.get("miles")) if pd.notna(d.get("miles")) else None
                 if not lane_match.empty:
                     lane = lane_match.iloc[0]
@@ -1415,7 +1416,7 @@ elif section == "Planner":
                     lead_table=lead_tbl,
                     sku_lead_override=sku_ov,
                     manual_lead_override=(manual_input if manual_input > 0 else None),
-                    phase=str(d.get("phase") or ""),
+                    phase=demand_phase,
                     phase_defaults=phase_cfg,
                     rate_cards=rate_cards.to_dict("records") if not rate_cards.empty else [],
                     rate_charges=rate_charges.to_dict("records") if not rate_charges.empty else [],
@@ -65,7 +65,7 @@ def plan_containers_no_mix(
         if packs_fit <= 0:
             raise ValueError(f"SKU {sku_id} cannot fit selected container/equipment")
         containers_needed = ceil(int(qty["packs_required"]) / packs_fit)
-        caps = equipment_capacity(container_equipment)
+        caps = fit["capacity"]
         shipped_packs = int(qty["packs_required"])
         used_weight = shipped_packs * pack_gross_kg(pack_rule)
         used_volume = shipped_packs * pack_volume_m3(pack_rule)
@@ -11,7 +11,7 @@ import pandas as pd
 
 from batch_planner import plan_trucks_mix_ok
 from constraints_engine import max_units_per_conveyance
-from fit_engine import equipment_capacity, pack_gross_kg, pack_volume_m3, required_packs_for_kg
+from fit_engine import pack_gross_kg, pack_volume_m3, required_packs_for_kg
 from planner import norm_mode, norm_equipment_code
 
 REQUIRED_COLUMNS = ["phase_name", "need_date", "part_number", "required_kg"]
@@ -245,7 +245,7 @@ def generate_container_plan(conn: sqlite3.Connection, bom_run_id: int, policy: B
                 continue
             try:
                 fit = max_units_per_conveyance(sku_id, pack_rule, selected, context={})
-                caps = equipment_capacity(selected)
+                caps = fit["capacity"]
             except ValueError:
                 continue
             packs_fit = int(fit["max_units"])
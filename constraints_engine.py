@@ -230,5 +230,6 @@ def max_units_per_conveyance(
         "breakdown": positive_constraints,
         "packs_per_layer": per_layer,
         "layers_allowed": layers,
+        "capacity": caps,
         "notes": ["Estimated legal payload based on assumed axle distribution.", "SOLAS/VGM compliance remains operationally required for ocean exports."],
     }
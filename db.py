@@ -8,6 +8,7 @@ import os
 import json
 import sqlite3
 from datetime import date
+from itertools import islice
 from pathlib import Path
 from typing import Callable, Iterable
 
@@ -1355,10 +1356,27 @@ def _migration_19_sku_hts_code(conn: sqlite3.Connection) -> None:
 MIGRATIONS.append((19, _migration_19_sku_hts_code))
 
 
+DEMAND_LINE_COLUMNS = ("sku_id", "need_date", "qty", "coo_override", "priority", "notes", "phase", "mode_override", "service_scope", "miles")
+
+
 def get_conn() -> sqlite3.Connection:
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys=ON;")
+    # ~20 MB page cache (negative = KiB) so repeated catalog reads stay in memory.
+    conn.execute("PRAGMA cache_size=-20000;")
+    return conn
+
+
+def get_read_conn() -> sqlite3.Connection:
+    """Connection for read-heavy planning queries (catalog loaders, quick plan runs).
+
+    Temp b-trees for ORDER BY / UNION sorts stay in memory and pages are read through a
+    256 MB memory map. Kept off get_conn so writers and migrations use SQLite defaults.
+    """
+    conn = get_conn()
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA mmap_size=268435456;")
     return conn
 
 
@@ -1391,10 +1409,28 @@ def run_migrations() -> None:
             conn.execute("INSERT INTO schema_migrations(version) VALUES (?)", (version,))
 
 
+_MIGRATED_DB_PATHS: set[Path] = set()
+
+
+def ensure_migrated() -> None:
+    """Run migrations once per process for the active DB_PATH.
+
+    Streamlit re-executes page scripts on every interaction; the schema only
+    needs checking the first time (or if the database file disappears).
+    """
+    if DB_PATH in _MIGRATED_DB_PATHS and DB_PATH.exists():
+        return
+    run_migrations()
+    _MIGRATED_DB_PATHS.add(DB_PATH)
+
+
 def insert_many(
-    conn: sqlite3.Connection, query: str, rows: Iterable[tuple[object, ...]]
+    conn: sqlite3.Connection, query: str, rows: Iterable[tuple[object, ...]], chunk_size: int = 10_000
 ) -> None:
-    conn.executemany(query, rows)
+    """Run ``query`` over ``rows`` in executemany batches of at most ``chunk_size``."""
+    rows = iter(rows)
+    while batch := list(islice(rows, chunk_size)):
+        conn.executemany(query, batch)
 
 
 def compute_grid_diff(original: pd.DataFrame, edited: pd.DataFrame, key_cols: list[str]) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
@@ -1443,6 +1479,21 @@ def _to_native(value: object) -> object:
     return value.item() if hasattr(value, "item") else value
 
 
+def append_rows(conn: sqlite3.Connection, table: str, rows: pd.DataFrame, chunk_size: int = 10_000) -> int:
+    """Append frame rows via insert_many, mapping NaN to NULL; returns the row count."""
+    if rows.empty:
+        return 0
+    columns = list(rows.columns)
+    placeholders = ", ".join(["?"] * len(columns))
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    values = (
+        tuple(None if pd.isna(v) else _to_native(v) for v in row)
+        for row in rows.itertuples(index=False, name=None)
+    )
+    insert_many(conn, sql, values, chunk_size)
+    return len(rows)
+
+
 def delete_rows(conn: sqlite3.Connection, table: str, rows: pd.DataFrame, key_cols: list[str]) -> None:
     if rows.empty:
         return
@@ -1859,11 +1910,19 @@ def map_import_demand_rows(
     errors: list[str] = []
 
     if "supplier_code" in frame.columns:
-        merged = frame.merge(
-            sku_catalog[["sku_id", "part_number", "supplier_code"]],
-            on=["part_number", "supplier_code"],
-            how="left",
+        # Hash lookup against the (small) catalog instead of a merge; keeps row order.
+        key_cols = ["part_number", "supplier_code"]
+        sku_by_key = pd.Series(
+            sku_catalog["sku_id"].to_numpy(),
+            index=pd.MultiIndex.from_frame(sku_catalog[key_cols]),
         )
+        duplicated = sku_by_key.index.duplicated(keep="first")
+        if duplicated.any():
+            # A merge would silently fan rows out here; fail the import instead.
+            errors.append("SKU catalog has duplicate part_number + supplier_code entries")
+            sku_by_key = sku_by_key[~duplicated]
+        merged = frame.reset_index(drop=True)
+        merged["sku_id"] = sku_by_key.reindex(pd.MultiIndex.from_frame(merged[key_cols])).to_numpy()
         missing = merged[merged["sku_id"].isna()]
         if not missing.empty:
             errors.append("Some rows did not map to sku_id from part_number + supplier_code")
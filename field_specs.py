@@ -199,6 +199,9 @@ TABLE_SPECS: dict[str, dict[str, FieldSpec]] = {
     },
 }
 
+# Columns a demand upload must carry before it is validated and mapped to SKUs.
+DEMAND_IMPORT_REQUIRED = tuple(name for name, spec in TABLE_SPECS["demand_import"].items() if spec.required)
+
 
 def build_help_text(table_key: str, field: str) -> str:
     spec = TABLE_SPECS.get(table_key, {}).get(field)
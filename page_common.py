@@ -0,0 +1,16 @@
+"""Helpers shared by the Streamlit planning pages."""
+from __future__ import annotations
+
+from pathlib import Path
+
+import streamlit as st
+
+# Shared viewport height for long result and upload grids, so they line up across pages.
+TABLE_HEIGHT = 400
+
+DEMAND_TEMPLATE_PATH = Path("templates") / "demand_template.csv"
+
+
+@st.cache_resource(show_spinner=False)
+def demand_template_bytes() -> bytes:
+    return DEMAND_TEMPLATE_PATH.read_bytes()
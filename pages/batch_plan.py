@@ -6,32 +6,33 @@ import pandas as pd
 import streamlit as st
 
 from batch_planner import plan_containers_no_mix, plan_trucks_mix_ok, plan_trucks_no_mix
-from db import get_conn, get_equipment_by_code, get_pack_rules_for_sku, map_import_demand_rows, run_migrations
+from db import DEMAND_LINE_COLUMNS, append_rows, ensure_migrated, get_conn, get_equipment_by_code, get_pack_rules_for_sku, map_import_demand_rows
 from seed import seed_if_empty
-from field_specs import TABLE_SPECS
+from field_specs import DEMAND_IMPORT_REQUIRED
+from page_common import DEMAND_TEMPLATE_PATH, TABLE_HEIGHT, demand_template_bytes
 from validators import validate_dates, validate_with_specs
-from pathlib import Path
 
 st.set_page_config(page_title="Batch Plan", layout="wide")
-run_migrations()
+ensure_migrated()
 seed_if_empty()
 conn = get_conn()
 
 
+UTIL_COLS = ["cube_util", "weight_util"]
+CONTAINER_DISPLAY_COLS = ["part_number", "equipment_code", "packs_fit", "containers_needed", "limiting_constraint", *UTIL_COLS]
+
 
 def render_demand_upload_box(conn) -> None:
     with st.expander("Upload data to fill this page", expanded=False):
-        demand_template = Path("templates") / "demand_template.csv"
-        if demand_template.exists():
-            st.download_button("Download demand_template.csv", data=demand_template.read_bytes(), file_name="demand_template.csv", mime="text/csv", key="batch_demand_template")
+        if DEMAND_TEMPLATE_PATH.exists():
+            st.download_button("Download demand_template.csv", data=demand_template_bytes(), file_name="demand_template.csv", mime="text/csv", key="batch_demand_template")
         upload = st.file_uploader("Upload demand csv", type=["csv"], key="batch_demand_upload")
         if upload is None:
             return
         frame = pd.read_csv(upload)
-        edited = st.data_editor(frame, num_rows="dynamic", width="stretch", key="batch_demand_editor")
+        edited = st.data_editor(frame, num_rows="dynamic", width="stretch", height=TABLE_HEIGHT, key="batch_demand_editor")
         if st.button("Append uploaded demand", key="batch_append_demand"):
-            required = [name for name, spec in TABLE_SPECS["demand_import"].items() if spec.required]
-            missing = [col for col in required if col not in edited.columns]
+            missing = [col for col in DEMAND_IMPORT_REQUIRED if col not in edited.columns]
             if missing:
                 st.error("Missing required columns: " + ", ".join(missing))
                 st.stop()
@@ -47,9 +48,9 @@ def render_demand_upload_box(conn) -> None:
             if map_errors:
                 st.error("; ".join(map_errors))
                 st.stop()
-            to_insert = merged[["sku_id", "need_date", "qty", "coo_override", "priority", "notes", "phase", "mode_override", "service_scope", "miles"]]
+            to_insert = merged[list(DEMAND_LINE_COLUMNS)]
             with conn:
-                to_insert.to_sql("demand_lines", conn, if_exists="append", index=False)
+                append_rows(conn, "demand_lines", to_insert)
             st.success(f"Appended {len(to_insert)} demand rows")
 
 st.title("Batch Plan")
@@ -179,11 +180,10 @@ if st.button("Run Batch Plan", type="primary"):
 
     container_df = pd.DataFrame(container_result["per_sku"])
     if not container_df.empty:
-        container_df["cube_util"] = (container_df["cube_util"] * 100).round(1)
-        container_df["weight_util"] = (container_df["weight_util"] * 100).round(1)
+        container_df[UTIL_COLS] = container_df[UTIL_COLS].mul(100).round(1)
         st.subheader("Container results")
         st.dataframe(
-            container_df[["part_number", "equipment_code", "packs_fit", "containers_needed", "limiting_constraint", "cube_util", "weight_util"]],
+            container_df[CONTAINER_DISPLAY_COLS],
             width="stretch",
             hide_index=True,
         )
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
+from functools import partial
 
 import pandas as pd
 import streamlit as st
@@ -15,14 +16,14 @@ from bom_planner import (
     read_bom_upload,
     validate_bom_frame,
 )
-from db import get_conn, map_import_demand_rows, run_migrations
+from db import DEMAND_LINE_COLUMNS, append_rows, ensure_migrated, get_conn, map_import_demand_rows
 from seed import seed_if_empty
-from field_specs import TABLE_SPECS
+from field_specs import DEMAND_IMPORT_REQUIRED
+from page_common import DEMAND_TEMPLATE_PATH, TABLE_HEIGHT, demand_template_bytes
 from validators import validate_dates, validate_with_specs
-from pathlib import Path
 
 st.set_page_config(page_title="BOM Planner", layout="wide")
-run_migrations()
+ensure_migrated()
 seed_if_empty()
 conn = get_conn()
 
@@ -31,17 +32,15 @@ conn = get_conn()
 def render_demand_upload_box(conn) -> None:
     with st.expander("Upload data to fill this page", expanded=False):
         st.caption("Optional demand upload to populate planning data while using BOM workflows.")
-        demand_template = Path("templates") / "demand_template.csv"
-        if demand_template.exists():
-            st.download_button("Download demand_template.csv", data=demand_template.read_bytes(), file_name="demand_template.csv", mime="text/csv", key="bom_demand_template")
+        if DEMAND_TEMPLATE_PATH.exists():
+            st.download_button("Download demand_template.csv", data=demand_template_bytes(), file_name="demand_template.csv", mime="text/csv", key="bom_demand_template")
         upload = st.file_uploader("Upload demand csv", type=["csv"], key="bom_demand_upload")
         if upload is None:
             return
         frame = pd.read_csv(upload)
-        edited = st.data_editor(frame, num_rows="dynamic", width="stretch", key="bom_demand_editor")
+        edited = st.data_editor(frame, num_rows="dynamic", width="stretch", height=TABLE_HEIGHT, key="bom_demand_editor")
         if st.button("Append uploaded demand", key="bom_append_demand"):
-            required = [name for name, spec in TABLE_SPECS["demand_import"].items() if spec.required]
-            missing = [col for col in required if col not in edited.columns]
+            missing = [col for col in DEMAND_IMPORT_REQUIRED if col not in edited.columns]
             if missing:
                 st.error("Missing required columns: " + ", ".join(missing))
                 st.stop()
@@ -57,11 +56,137 @@ def render_demand_upload_box(conn) -> None:
             if map_errors:
                 st.error("; ".join(map_errors))
                 st.stop()
-            to_insert = merged[["sku_id", "need_date", "qty", "coo_override", "priority", "notes", "phase", "mode_override", "service_scope", "miles"]]
+            to_insert = merged[list(DEMAND_LINE_COLUMNS)]
             with conn:
-                to_insert.to_sql("demand_lines", conn, if_exists="append", index=False)
+                append_rows(conn, "demand_lines", to_insert)
             st.success(f"Appended {len(to_insert)} demand rows")
 
+
+# Each tab body reruns on its own when its widgets change instead of
+# re-executing every tab's queries; older Streamlit falls back to a plain call.
+_fragment = st.fragment if hasattr(st, "fragment") else (lambda fn: fn)
+
+
+@_fragment
+def render_pack_tab(selected_run: int | None) -> None:
+    if not selected_run:
+        return
+    if st.button("Generate Pack Plan", key="pack"):
+        generate_pack_plan(conn, int(selected_run))
+    df = pd.read_sql_query(
+        """
+        SELECT p.phase_name, p.need_date, sm.part_number, p.required_kg, p.shipped_kg, p.excess_kg, p.packs_required, pr.pack_name
+        FROM pack_plan_lines p
+        JOIN sku_master sm ON sm.sku_id = p.sku_id
+        JOIN packaging_rules pr ON pr.id = p.pack_rule_id
+        WHERE p.bom_run_id = ?
+        ORDER BY p.phase_name, p.need_date, sm.part_number
+        """,
+        conn,
+        params=(selected_run,),
+    )
+    st.dataframe(df, width="stretch", height=TABLE_HEIGHT, hide_index=True)
+
+
+@_fragment
+def render_container_tab(selected_run: int | None, policy: BomPlanningPolicy) -> None:
+    if not selected_run:
+        return
+    if st.button("Generate Container Plan", key="container"):
+        generate_container_plan(conn, int(selected_run), policy)
+    df = pd.read_sql_query(
+        """
+        SELECT c.phase_name, c.need_date, sm.part_number, c.equipment_code, c.packs_fit, c.containers_needed,
+               ROUND(c.cube_util*100,1) cube_util_pct, ROUND(c.weight_util*100,1) weight_util_pct, c.limiting_constraint
+        FROM container_plan_lines c
+        JOIN sku_master sm ON sm.sku_id = c.sku_id
+        WHERE c.bom_run_id = ?
+        ORDER BY c.phase_name, c.need_date, sm.part_number
+        """,
+        conn,
+        params=(selected_run,),
+    )
+    st.dataframe(df, width="stretch", height=TABLE_HEIGHT, hide_index=True)
+    if not df.empty:
+        st.write("Totals")
+        st.dataframe(df.groupby(["phase_name", "need_date"], as_index=False)["containers_needed"].sum(), hide_index=True)
+
+
+@_fragment
+def render_truck_tab(selected_run: int | None, policy: BomPlanningPolicy) -> None:
+    if not selected_run:
+        return
+    if st.button("Generate Truck Plan", key="truck"):
+        generate_truck_plan(conn, int(selected_run), policy)
+    summary = pd.read_sql_query("SELECT * FROM truck_plan_runs WHERE bom_run_id = ?", conn, params=(selected_run,))
+    st.dataframe(summary, width="stretch", hide_index=True)
+    trucks = pd.read_sql_query("SELECT * FROM truck_plan_trucks WHERE bom_run_id = ?", conn, params=(selected_run,))
+    items = pd.read_sql_query("SELECT * FROM truck_plan_truck_items WHERE bom_run_id = ?", conn, params=(selected_run,))
+    for _, tr in trucks.iterrows():
+        with st.expander(f"{tr['phase_name']} {tr['need_date']} Truck {int(tr['truck_index'])}"):
+            st.write(tr.to_dict())
+            t_items = items[
+                (items["phase_name"] == tr["phase_name"]) &
+                (items["need_date"] == tr["need_date"]) &
+                (items["truck_index"] == tr["truck_index"])
+            ]
+            st.dataframe(t_items, height=TABLE_HEIGHT, hide_index=True)
+
+
+@_fragment
+def render_schedule_tab(selected_run: int | None) -> None:
+    if not selected_run:
+        return
+    if st.button("Generate Schedule", key="schedule"):
+        generate_schedule_summary(conn, int(selected_run))
+    df = pd.read_sql_query(
+        """
+        SELECT s.phase_name, s.need_date, sm.part_number, s.mode, s.lead_days, s.ship_by_date
+        FROM schedule_summary s
+        JOIN sku_master sm ON sm.sku_id = s.sku_id
+        WHERE s.bom_run_id = ?
+        ORDER BY s.phase_name, s.need_date, sm.part_number, s.mode
+        """,
+        conn,
+        params=(selected_run,),
+    )
+    st.dataframe(df, width="stretch", height=TABLE_HEIGHT, hide_index=True)
+
+
+EXPORT_TABLES = (
+    "pack_plan_lines",
+    "container_plan_lines",
+    "truck_plan_runs",
+    "truck_plan_trucks",
+    "truck_plan_truck_items",
+    "schedule_summary",
+)
+
+
+def export_csv(name: str, bom_run_id: int) -> bytes:
+    # Runs on the download thread, so it needs its own connection.
+    export_conn = get_conn()
+    try:
+        df = pd.read_sql_query(f"SELECT * FROM {name} WHERE bom_run_id = ?", export_conn, params=(bom_run_id,))
+    finally:
+        export_conn.close()
+    return df.to_csv(index=False).encode("utf-8")
+
+
+@_fragment
+def render_export_tab(selected_run: int | None) -> None:
+    if not selected_run:
+        return
+    for name in EXPORT_TABLES:
+        st.download_button(
+            f"Download {name}.csv",
+            data=partial(export_csv, name, int(selected_run)),
+            file_name=f"{name}_{selected_run}.csv",
+            mime="text/csv",
+            key=f"dl_{name}",
+        )
+
+
 st.title("BOM Planner")
 
 if hasattr(st, "page_link"):
@@ -95,7 +220,7 @@ with tabs[0]:
         frame = read_bom_upload(upload.name, upload.getvalue())
         mapped, errors, warnings = validate_bom_frame(conn, frame)
         st.write("Mapping/preview")
-        st.dataframe(mapped.head(100), width="stretch")
+        st.dataframe(mapped.head(100), width="stretch", height=TABLE_HEIGHT)
         for w in warnings:
             st.warning(w)
         for e in errors:
@@ -105,95 +230,16 @@ with tabs[0]:
             st.success(f"Saved bom_run_id={bom_run_id}")
 
 with tabs[1]:
-    if selected_run and st.button("Generate Pack Plan", key="pack"):
-        generate_pack_plan(conn, int(selected_run))
-    if selected_run:
-        df = pd.read_sql_query(
-            """
-            SELECT p.phase_name, p.need_date, sm.part_number, p.required_kg, p.shipped_kg, p.excess_kg, p.packs_required, pr.pack_name
-            FROM pack_plan_lines p
-            JOIN sku_master sm ON sm.sku_id = p.sku_id
-            JOIN packaging_rules pr ON pr.id = p.pack_rule_id
-            WHERE p.bom_run_id = ?
-            ORDER BY p.phase_name, p.need_date, sm.part_number
-            """,
-            conn,
-            params=(selected_run,),
-        )
-        st.dataframe(df, width="stretch", hide_index=True)
+    render_pack_tab(selected_run)
 
 with tabs[2]:
-    if selected_run and st.button("Generate Container Plan", key="container"):
-        generate_container_plan(conn, int(selected_run), policy)
-    if selected_run:
-        df = pd.read_sql_query(
-            """
-            SELECT c.phase_name, c.need_date, sm.part_number, c.equipment_code, c.packs_fit, c.containers_needed,
-                   ROUND(c.cube_util*100,1) cube_util_pct, ROUND(c.weight_util*100,1) weight_util_pct, c.limiting_constraint
-            FROM container_plan_lines c
-            JOIN sku_master sm ON sm.sku_id = c.sku_id
-            WHERE c.bom_run_id = ?
-            ORDER BY c.phase_name, c.need_date, sm.part_number
-            """,
-            conn,
-            params=(selected_run,),
-        )
-        st.dataframe(df, width="stretch", hide_index=True)
-        if not df.empty:
-            st.write("Totals")
-            st.dataframe(df.groupby(["phase_name", "need_date"], as_index=False)["containers_needed"].sum(), hide_index=True)
+    render_container_tab(selected_run, policy)
 
 with tabs[3]:
-    if selected_run and st.button("Generate Truck Plan", key="truck"):
-        generate_truck_plan(conn, int(selected_run), policy)
-    if selected_run:
-        summary = pd.read_sql_query("SELECT * FROM truck_plan_runs WHERE bom_run_id = ?", conn, params=(selected_run,))
-        st.dataframe(summary, width="stretch", hide_index=True)
-        trucks = pd.read_sql_query("SELECT * FROM truck_plan_trucks WHERE bom_run_id = ?", conn, params=(selected_run,))
-        items = pd.read_sql_query("SELECT * FROM truck_plan_truck_items WHERE bom_run_id = ?", conn, params=(selected_run,))
-        for _, tr in trucks.iterrows():
-            with st.expander(f"{tr['phase_name']} {tr['need_date']} Truck {int(tr['truck_index'])}"):
-                st.write(tr.to_dict())
-                t_items = items[
-                    (items["phase_name"] == tr["phase_name"]) &
-                    (items["need_date"] == tr["need_date"]) &
-                    (items["truck_index"] == tr["truck_index"])
-                ]
-                st.dataframe(t_items, hide_index=True)
+    render_truck_tab(selected_run, policy)
 
 with tabs[4]:
-    if selected_run and st.button("Generate Schedule", key="schedule"):
-        generate_schedule_summary(conn, int(selected_run))
-    if selected_run:
-        df = pd.read_sql_query(
-            """
-            SELECT s.phase_name, s.need_date, sm.part_number, s.mode, s.lead_days, s.ship_by_date
-            FROM schedule_summary s
-            JOIN sku_master sm ON sm.sku_id = s.sku_id
-            WHERE s.bom_run_id = ?
-            ORDER BY s.phase_name, s.need_date, sm.part_number, s.mode
-            """,
-            conn,
-            params=(selected_run,),
-        )
-        st.dataframe(df, width="stretch", hide_index=True)
+    render_schedule_tab(selected_run)
 
 with tabs[5]:
-    if selected_run:
-        names = [
-            "pack_plan_lines",
-            "container_plan_lines",
-            "truck_plan_runs",
-            "truck_plan_trucks",
-            "truck_plan_truck_items",
-            "schedule_summary",
-        ]
-        for name in names:
-            df = pd.read_sql_query(f"SELECT * FROM {name} WHERE bom_run_id = ?", conn, params=(selected_run,))
-            st.download_button(
-                f"Download {name}.csv",
-                data=df.to_csv(index=False).encode("utf-8"),
-                file_name=f"{name}_{selected_run}.csv",
-                mime="text/csv",
-                key=f"dl_{name}",
-            )
+    render_export_tab(selected_run)
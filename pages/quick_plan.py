@@ -1,32 +1,107 @@
 from __future__ import annotations
 
+from contextlib import closing
 from datetime import date
 
 import pandas as pd
 import streamlit as st
 
-from db import get_conn, map_import_demand_rows, run_migrations
+from db import DB_PATH, DEMAND_LINE_COLUMNS, append_rows, ensure_migrated, get_conn, get_read_conn, map_import_demand_rows
 from planning_engine import plan_quick_run
 from seed import seed_if_empty
-from field_specs import TABLE_SPECS
+from field_specs import DEMAND_IMPORT_REQUIRED
+from page_common import DEMAND_TEMPLATE_PATH, TABLE_HEIGHT, demand_template_bytes
 from validators import validate_dates, validate_with_specs
 
 st.set_page_config(page_title="Quick Plan", layout="wide")
-run_migrations()
+ensure_migrated()
 seed_if_empty()
 
-from pathlib import Path
+EQ_DISPLAY_COLS = [
+    "equipment_code",
+    "equipment_name",
+    "packs_per_layer",
+    "layers_allowed",
+    "packs_fit",
+    "limiting_constraint",
+    "equipment_count",
+    "cube_util_pct",
+    "weight_util_pct",
+    "est_cost",
+]
+EQ_COLS = ["mode", *EQ_DISPLAY_COLS, "constraint_breakdown"]
+
+
+# Every DB write yields a new stamp, so bound the catalog caches: keep only the last few
+# stamps (pack rules are also keyed per SKU) and expire anything idle for an hour.
+CATALOG_CACHE_TTL = 3600
+CATALOG_CACHE_ENTRIES = 4
+PACK_RULE_CACHE_ENTRIES = 64
+
+
+def _db_stamp() -> int:
+    """Cache key that changes whenever the SQLite file is written."""
+    return DB_PATH.stat().st_mtime_ns if DB_PATH.exists() else 0
+
+
+@st.cache_data(show_spinner=False, ttl=CATALOG_CACHE_TTL, max_entries=CATALOG_CACHE_ENTRIES)
+def load_sku_df(db_stamp: int) -> pd.DataFrame:
+    with closing(get_read_conn()) as read_conn:
+        return pd.read_sql_query(
+            """
+            SELECT sm.sku_id, sm.part_number, sm.description, sm.default_coo, s.supplier_code,
+                   sm.part_number || ' [' || s.supplier_code || ']' AS sku_label
+            FROM sku_master sm
+            JOIN suppliers s ON s.supplier_id = sm.supplier_id
+            ORDER BY sm.part_number, s.supplier_code
+            """,
+            read_conn,
+        ).set_index("sku_label", drop=False)
+
+
+@st.cache_data(show_spinner=False, ttl=CATALOG_CACHE_TTL, max_entries=PACK_RULE_CACHE_ENTRIES)
+def load_pack_rules(db_stamp: int, sku_id: int) -> pd.DataFrame:
+    with closing(get_read_conn()) as read_conn:
+        return pd.read_sql_query(
+            "SELECT id, pack_name, units_per_pack, kg_per_unit, id || ' - ' || pack_name AS label FROM packaging_rules WHERE sku_id = ? ORDER BY is_default DESC, id",
+            read_conn,
+            params=(sku_id,),
+        )
+
+
+@st.cache_data(show_spinner=False, ttl=CATALOG_CACHE_TTL, max_entries=CATALOG_CACHE_ENTRIES)
+def load_lanes(db_stamp: int) -> pd.DataFrame:
+    with closing(get_read_conn()) as read_conn:
+        return pd.read_sql_query("SELECT origin_code || ' -> ' || dest_code AS label FROM lanes ORDER BY origin_code, dest_code", read_conn)
+
+
+@st.cache_data(show_spinner=False, ttl=CATALOG_CACHE_TTL, max_entries=CATALOG_CACHE_ENTRIES)
+def load_juris(db_stamp: int) -> pd.DataFrame:
+    with closing(get_read_conn()) as read_conn:
+        return pd.read_sql_query("SELECT jurisdiction_code FROM jurisdiction_weight_rules WHERE active = 1 ORDER BY jurisdiction_code", read_conn)
+
+
+@st.cache_data(show_spinner=False, ttl=CATALOG_CACHE_TTL, max_entries=CATALOG_CACHE_ENTRIES)
+def load_truck_configs(db_stamp: int) -> pd.DataFrame:
+    with closing(get_read_conn()) as read_conn:
+        return pd.read_sql_query(
+            "SELECT truck_config_code || ' - ' || IFNULL(description, '') AS label FROM truck_configs WHERE active = 1 ORDER BY truck_config_code",
+            read_conn,
+        )
 
 
+def _clear_catalog_caches() -> None:
+    for loader in (load_sku_df, load_pack_rules, load_lanes, load_juris, load_truck_configs):
+        loader.clear()
+
 
 def render_demand_upload_box(conn) -> None:
     with st.expander("Upload data to fill this page", expanded=False):
         st.caption("Upload demand_template.csv-compatible demand to append rows used by planning screens.")
-        demand_template = Path("templates") / "demand_template.csv"
-        if demand_template.exists():
+        if DEMAND_TEMPLATE_PATH.exists():
             st.download_button(
                 "Download demand_template.csv",
-                data=demand_template.read_bytes(),
+                data=demand_template_bytes(),
                 file_name="demand_template.csv",
                 mime="text/csv",
                 key="quick_demand_template",
@@ -35,10 +110,9 @@ def render_demand_upload_box(conn) -> None:
         if upload is None:
             return
         frame = pd.read_csv(upload)
-        edited = st.data_editor(frame, num_rows="dynamic", width="stretch", key="quick_demand_editor")
+        edited = st.data_editor(frame, num_rows="dynamic", width="stretch", height=TABLE_HEIGHT, key="quick_demand_editor")
         if st.button("Append uploaded demand", key="quick_append_demand"):
-            required = [name for name, spec in TABLE_SPECS["demand_import"].items() if spec.required]
-            missing = [col for col in required if col not in edited.columns]
+            missing = [col for col in DEMAND_IMPORT_REQUIRED if col not in edited.columns]
             if missing:
                 st.error("Missing required columns: " + ", ".join(missing))
                 st.stop()
@@ -58,10 +132,10 @@ def render_demand_upload_box(conn) -> None:
             if map_errors:
                 st.error("; ".join(map_errors))
                 st.stop()
-            cols = ["sku_id", "need_date", "qty", "coo_override", "priority", "notes", "phase", "mode_override", "service_scope", "miles"]
-            to_insert = merged[cols]
+            to_insert = merged[list(DEMAND_LINE_COLUMNS)]
             with conn:
-                to_insert.to_sql("demand_lines", conn, if_exists="append", index=False)
+                append_rows(conn, "demand_lines", to_insert)
+            _clear_catalog_caches()
             st.success(f"Appended {len(to_insert)} demand rows")
 
 st.title("Quick Plan")
@@ -80,23 +154,15 @@ conn = get_conn()
 render_demand_upload_box(conn)
 
 
-sku_df = pd.read_sql_query(
-    """
-    SELECT sm.sku_id, sm.part_number, sm.description, sm.default_coo, s.supplier_code,
-           sm.part_number || ' [' || s.supplier_code || ']' AS sku_label
-    FROM sku_master sm
-    JOIN suppliers s ON s.supplier_id = sm.supplier_id
-    ORDER BY sm.part_number, s.supplier_code
-    """,
-    conn,
-)
+db_stamp = _db_stamp()
+sku_df = load_sku_df(db_stamp)
 
 if sku_df.empty:
     st.warning("No SKUs found. Add SKU records first.")
     st.stop()
 
 sku_choice = st.selectbox("Supplier / Part Number", sku_df["sku_label"].tolist())
-sku_row = sku_df[sku_df["sku_label"] == sku_choice].iloc[0]
+sku_row = sku_df.loc[sku_choice]
 sku_id = int(sku_row["sku_id"])
 
 qty_basis = st.selectbox(
@@ -114,17 +180,13 @@ required_qty = st.number_input(
 need_date = st.date_input("Need date", value=date.today())
 coo_override = st.text_input("COO override (optional)", value="")
 
-pack_rules = pd.read_sql_query(
-    "SELECT id, pack_name, units_per_pack, kg_per_unit FROM packaging_rules WHERE sku_id = ? ORDER BY is_default DESC, id",
-    conn,
-    params=(sku_id,),
-)
-pack_options = ["(default)"] + [f"{int(r['id'])} - {r['pack_name']}" for _, r in pack_rules.iterrows()]
+pack_rules = load_pack_rules(db_stamp, sku_id)
+pack_options = ["(default)"] + pack_rules["label"].tolist()
 pack_choice = st.selectbox("Pack rule (optional)", pack_options)
 pack_rule_id = None if pack_choice == "(default)" else int(pack_choice.split(" - ")[0])
 
-lanes = pd.read_sql_query("SELECT origin_code, dest_code FROM lanes ORDER BY origin_code, dest_code", conn)
-lane_options = ["(none)"] + [f"{r['origin_code']} -> {r['dest_code']}" for _, r in lanes.iterrows()]
+lanes = load_lanes(db_stamp)
+lane_options = ["(none)"] + lanes["label"].tolist()
 lane_choice = st.selectbox("Lane (optional)", lane_options)
 lane_origin = None
 lane_dest = None
@@ -134,15 +196,31 @@ if lane_choice != "(none)":
 service_scope = st.selectbox("Service scope", ["P2P", "P2D", "D2P", "D2D"], index=0)
 modes = st.multiselect("Mode filter", ["AIR", "OCEAN", "TRUCK", "DRAY"], default=["AIR", "OCEAN", "TRUCK"])
 
-juris_df = pd.read_sql_query("SELECT jurisdiction_code FROM jurisdiction_weight_rules WHERE active = 1 ORDER BY jurisdiction_code", conn)
+juris_df = load_juris(db_stamp)
 juris_options = juris_df["jurisdiction_code"].tolist() if not juris_df.empty else ["US_FED_INTERSTATE"]
 jurisdiction_code = st.selectbox("Jurisdiction", juris_options, index=juris_options.index("US_FED_INTERSTATE") if "US_FED_INTERSTATE" in juris_options else 0)
 
-truck_df = pd.read_sql_query("SELECT truck_config_code, description FROM truck_configs WHERE active = 1 ORDER BY truck_config_code", conn)
-truck_options = [f"{r['truck_config_code']} - {r['description']}" for _, r in truck_df.iterrows()] if not truck_df.empty else ["5AXLE_TL - default"]
+truck_df = load_truck_configs(db_stamp)
+truck_options = truck_df["label"].tolist() if not truck_df.empty else ["5AXLE_TL - default"]
 truck_choice = st.selectbox("Truck/Chassis Config", truck_options, index=0)
 truck_config_code = truck_choice.split(" - ")[0]
 
+# Results are kept in session state so the allocation editor and equipment inspector below
+# survive the reruns their own widgets trigger; changing any input hides the stale run.
+plan_inputs = (
+    sku_id,
+    qty_basis,
+    required_qty,
+    need_date.isoformat(),
+    coo_override,
+    pack_rule_id,
+    lane_choice,
+    service_scope,
+    tuple(modes),
+    jurisdiction_code,
+    truck_config_code,
+)
+
 if st.button("Run Plan", type="primary"):
     selected_pack_rule = None
     if pack_rule_id is not None and not pack_rules.empty:
@@ -160,21 +238,26 @@ if st.button("Run Plan", type="primary"):
     else:
         required_units = required_qty
 
-    result = plan_quick_run(
-        conn=conn,
-        sku_id=sku_id,
-        required_units=required_units,
-        need_date=need_date.isoformat(),
-        coo_override=coo_override.strip() or None,
-        pack_rule_id=pack_rule_id,
-        lane_origin_code=lane_origin,
-        lane_dest_code=lane_dest,
-        service_scope=service_scope,
-        modes=modes,
-        jurisdiction_code=jurisdiction_code,
-        truck_config_code=truck_config_code,
-    )
+    with closing(get_read_conn()) as read_conn:
+        result = plan_quick_run(
+            conn=read_conn,
+            sku_id=sku_id,
+            required_units=required_units,
+            need_date=need_date.isoformat(),
+            coo_override=coo_override.strip() or None,
+            pack_rule_id=pack_rule_id,
+            lane_origin_code=lane_origin,
+            lane_dest_code=lane_dest,
+            service_scope=service_scope,
+            modes=modes,
+            jurisdiction_code=jurisdiction_code,
+            truck_config_code=truck_config_code,
+        )
+    st.session_state["quick_plan_run"] = {"inputs": plan_inputs, "result": result}
 
+quick_run = st.session_state.get("quick_plan_run")
+if quick_run is not None and quick_run["inputs"] == plan_inputs:
+    result = quick_run["result"]
     sku = result["sku"]
     st.subheader("Summary")
     st.write(
@@ -183,15 +266,13 @@ if st.button("Run Plan", type="primary"):
         f"Shipped units: `{result['shipped_units']}` | Excess: `{result['excess_units']}` | Packs: `{result['packs_required']}`"
     )
 
-    eq_df = pd.DataFrame(result["equipment"])
+    eq_df = pd.DataFrame.from_records(result["equipment"], columns=EQ_COLS)
     if not eq_df.empty:
-        eq_df["cube_util%"] = (eq_df["cube_util"] * 100).round(1)
-        eq_df["weight_util%"] = (eq_df["weight_util"] * 100).round(1)
         st.subheader("Equipment fit by mode")
         for mode_name, mode_group in eq_df.groupby("mode", sort=True):
             st.markdown(f"**{mode_name}**")
             st.dataframe(
-                mode_group[["equipment_code", "equipment_name", "packs_per_layer", "layers_allowed", "packs_fit", "limiting_constraint", "equipment_count", "cube_util%", "weight_util%", "est_cost"]],
+                mode_group[EQ_DISPLAY_COLS],
                 width="stretch",
                 hide_index=True,
             )
@@ -263,9 +344,14 @@ if st.button("Run Plan", type="primary"):
 
     if not eq_df.empty:
         st.subheader("Constraint breakdown")
-        for _, row in eq_df.iterrows():
-            with st.expander(f"{row['equipment_code']} / {row['equipment_name']}", expanded=False):
-                st.json(row.get("constraint_breakdown", []))
+        inspect_labels = (eq_df["equipment_code"].fillna("").astype(str) + " / " + eq_df["equipment_name"].fillna("").astype(str)).tolist()
+        inspect_choice = st.selectbox(
+            "Inspect equipment",
+            range(len(inspect_labels)),
+            format_func=inspect_labels.__getitem__,
+            key=f"quick_inspect_{sku_id}_{need_date.isoformat()}",
+        )
+        st.json(eq_df["constraint_breakdown"].iloc[inspect_choice] or [])
 
     excluded_df = pd.DataFrame(result.get("excluded_equipment", []))
     if not excluded_df.empty:
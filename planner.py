@@ -2,12 +2,16 @@
 from __future__ import annotations
 
 from collections import defaultdict
+from collections.abc import Mapping
 from dataclasses import dataclass
+from functools import lru_cache
+import heapq
 from datetime import date, timedelta
-from rate_engine import RateTestInput, compute_rate_total, select_best_rate_card
+from rate_engine import RateTestInput, compute_rate_total, index_charges, index_rate_cards, select_best_rate_card, shipment_lane_key
 from constraints_engine import max_units_per_conveyance
 from fit_engine import equipment_count_for_packs
 from math import ceil
+from types import MappingProxyType
 
 from models import (
     Equipment,
@@ -17,6 +21,7 @@ from models import (
 )
 
 
+@lru_cache(maxsize=256)
 def norm_mode(mode: str | None) -> str:
     return (mode or "").strip().upper()
 
@@ -26,6 +31,13 @@ def norm_equipment_code(code: str | None) -> str:
 
 
 def safe_float(value: object, default: float = 0.0) -> float:
+    # Exact-type fast paths skip the try block for the common numeric inputs.
+    if type(value) is float:
+        return value
+    if type(value) is int:
+        return float(value)
+    if value is None:
+        return default
     try:
         return float(value)
     except (TypeError, ValueError):
@@ -33,13 +45,21 @@ def safe_float(value: object, default: float = 0.0) -> float:
 
 
 def safe_int(value: object, default: int = 0) -> int:
+    if type(value) is int:
+        return value
+    if value is None:
+        return default
     try:
         return int(value)
     except (TypeError, ValueError):
         return default
 
 
-@dataclass
+# Domestic truck legs never carry flatrack or oversize surcharges.
+_DOMESTIC_TRUCK_FLAGS = MappingProxyType({"flatrack": False, "over_height": False, "over_width": False, "over_height_width": False})
+
+
+@dataclass(slots=True)
 class TrancheResult:
     sku_id: int
     part_number: str
@@ -65,39 +85,52 @@ def allocate_tranches(
     Tranches format: (name, type, value), where type is 'percent' or 'absolute'.
     """
     demand_qty = max(0.0, safe_float(demand_qty))
-    tranche_targets: list[tuple[str, float]] = []
+    # carry_excess depends on the previous tranche's pack rounding, so this is
+    # an inherently serial scan; keep it a single pass with hoisted invariants.
+    units_per_pack = rule.units_per_pack
+    part_number = rule.part_number
+    row_need_date = need_date or date.today()
+    carry_excess = 0.0
+    rows: list[TrancheResult] = []
     for name, alloc_type, value in tranches:
-        alloc = (alloc_type or "").strip().lower()
-        if alloc == "percent":
+        if (alloc_type or "").strip().lower() == "percent":
             target = demand_qty * safe_float(value) / 100.0
         else:
             target = max(0.0, safe_float(value))
-        tranche_targets.append((name, target))
-
-    carry_excess = 0.0
-    rows: list[TrancheResult] = []
-    row_need_date = need_date or date.today()
-    for name, target in tranche_targets:
         requested = max(0.0, target - carry_excess)
         packs = rounded_order_packs(requested, rule)
-        shipped_units = packs * rule.units_per_pack
-        excess = max(0.0, shipped_units - requested)
-        carry_excess = excess
+        shipped_units = packs * units_per_pack
+        carry_excess = max(0.0, shipped_units - requested)
         rows.append(
             TrancheResult(
                 sku_id=sku_id,
-                part_number=rule.part_number,
+                part_number=part_number,
                 need_date=row_need_date,
                 tranche_name=name,
                 requested_units=requested,
                 shipped_units=shipped_units,
-                excess_units=excess,
+                excess_units=carry_excess,
                 packs=packs,
             )
         )
     return rows
 
 
+def _index_rates(rates: list[dict]) -> dict[tuple[str, str, str], tuple[int, dict]]:
+    """Map (mode, pricing_model, equipment) to the first matching rate and its list position."""
+    index: dict[tuple[str, str, str], tuple[int, dict]] = {}
+    for pos, r in enumerate(rates):
+        key = (norm_mode(r.get("mode")), str(r.get("pricing_model", "")).lower(), norm_equipment_code(r.get("equipment_name")))
+        index.setdefault(key, (pos, r))
+    return index
+
+
+def _first_rate(index: dict[tuple[str, str, str], tuple[int, dict]], keys: list[tuple[str, str, str]]) -> dict | None:
+    """Return the earliest-listed rate among the given keys, matching a linear scan."""
+    hits = [index[k] for k in keys if k in index]
+    return min(hits, key=lambda hit: hit[0])[1] if hits else None
+
+
 def lead_days_for(mode: str, coo: str, sku_id: int, lead_table: dict[tuple[str, str], int], sku_override: dict[tuple[int, str], int], manual_override: int | None = None) -> int:
     mode_key = norm_mode(mode)
     coo_key = (coo or "").strip().upper()
@@ -108,6 +141,21 @@ def lead_days_for(mode: str, coo: str, sku_id: int, lead_table: dict[tuple[str,
     return lead_table.get((coo_key, mode_key), 999)
 
 
+def _rec_sort_key(rec: dict) -> tuple[bool, float]:
+    """Feasible modes first, then cheapest."""
+    return (not rec["feasible"], rec["estimated_cost"])
+
+
+def phase_key(phase: object) -> str:
+    """Normalised phase name used both to key phase_defaults and to look them up."""
+    return str(phase or "").strip()
+
+
+def normalize_phase_defaults(rows: list[dict]) -> dict[str, dict]:
+    """Key phase_defaults rows by phase_key(phase), as recommend_modes looks them up."""
+    return {phase_key(r.get("phase")): r for r in rows}
+
+
 def recommend_modes(
     sku_id: int,
     part_number: str,
@@ -129,63 +177,95 @@ def recommend_modes(
     mode_override: str | None = None,
     route_info: dict | None = None,
     miles: float | None = None,
+    top_n: int | None = None,
 ):
     requested_units = max(0.0, safe_float(requested_units))
     shipped_packs = rounded_order_packs(requested_units, pack_rule)
     shipped_units = shipped_packs * pack_rule.units_per_pack
     excess_units = max(0.0, shipped_units - requested_units)
-    total_weight = (shipped_units / pack_rule.units_per_pack) * pack_rule.gross_pack_weight_kg
-    total_volume = (shipped_units / pack_rule.units_per_pack) * pack_rule.pack_cube_m3
+    pack_count = shipped_units / pack_rule.units_per_pack
+    total_weight = pack_count * pack_rule.gross_pack_weight_kg
+    total_volume = pack_count * pack_rule.pack_cube_m3
     total_packs = int(shipped_packs)
 
     recs = []
-    phase_defaults = phase_defaults or {}
-    phase_cfg = phase_defaults.get((phase or "").strip(), {})
+    # Callers pass phase already normalised with phase_key, matching normalize_phase_defaults.
+    phase_cfg = (phase_defaults or {}).get(phase, {})
     if phase_cfg.get("service_scope"):
         service_scope = phase_cfg["service_scope"]
 
-    normalized_eq: dict[str, list[Equipment]] = {}
-    for mode, items in equipment_by_mode.items():
-        normalized_eq.setdefault(norm_mode(mode), []).extend(items)
-    equipment_by_mode = normalized_eq
-    if mode_override:
-        equipment_by_mode = {k: v for k, v in equipment_by_mode.items() if k == norm_mode(mode_override)}
+    override_mode = norm_mode(mode_override) if mode_override else None
+    # Callers such as the Recommendations tab already key equipment by
+    # norm_mode; only rebuild the map when keys need merging or filtering.
+    if override_mode is not None or any(norm_mode(mode) != mode for mode in equipment_by_mode):
+        normalized_eq: dict[str, list[Equipment]] = {}
+        for mode, items in equipment_by_mode.items():
+            mode_key = norm_mode(mode)
+            if override_mode is None or mode_key == override_mode:
+                normalized_eq.setdefault(mode_key, []).extend(items)
+        equipment_by_mode = normalized_eq
+    # Same precedence as lead_days_for, with coo normalised once; the mode
+    # keys are already normalised above.
+    coo_key = (coo or "").strip().upper()
+    lead_days_by_mode = {
+        mode: manual_lead_override
+        if manual_lead_override is not None
+        else sku_lead_override.get((sku_id, mode), lead_table.get((coo_key, mode), 999))
+        for mode in equipment_by_mode
+    }
+
+    rate_index = _index_rates(rates)
 
     route = route_info or {}
     has_route = bool(route.get("origin_port") or route.get("dest_port") or route.get("supplier_city") or route.get("supplier_code") or route.get("plant_code") or route.get("plant"))
-    origin_port = route.get("origin_port", "")
-    dest_port = route.get("dest_port", "")
-    supplier_loc = route.get("supplier_city", route.get("supplier_code", ""))
-    plant_loc = route.get("plant_code", route.get("plant", ""))
+    # Without rate cards (or a route to price) every mode uses the flat rate table only.
+    price_legs = bool(rate_cards) and has_route
+    cards_by_lane = index_rate_cards(rate_cards) if price_legs else {}
+    charges_by_card = index_charges(rate_charges or []) if price_legs else {}
+    # Leg endpoints depend only on the service scope and route, not the mode;
+    # rate cards match on upper-case codes, so normalise them here once.
+    scope_key = service_scope.upper()
+    origin_port_key = (route.get("origin_port", "") or "").upper()
+    dest_port_key = (route.get("dest_port", "") or "").upper()
+    supplier_loc_key = (route.get("supplier_city", route.get("supplier_code", "")) or "").upper()
+    plant_loc_key = (route.get("plant_code", route.get("plant", "")) or "").upper()
+    from_port = service_scope.startswith("P")
+    to_port = service_scope.endswith("P")
+    main_o_type, main_o_code = ("PORT", origin_port_key) if from_port else ("CITY", supplier_loc_key)
+    main_d_type, main_d_code = ("PORT", dest_port_key) if to_port else ("CITY", plant_loc_key)
+    needs_dest_truck = service_scope in {"P2D", "D2D"}
+    needs_origin_truck = service_scope in {"D2P", "D2D"}
+
+    # Oversize checks depend only on the pack, so evaluate them once per call.
+    pack_over_w = not (pack_rule.dim_w_norm_m <= 2.35)
+    pack_over_h = not (pack_rule.dim_h_norm_m <= 2.39)
+    flags_by_eq: dict[str, dict] = {}
 
     def _flags(eq_name: str):
         eqn = (eq_name or "").upper()
-        l_ok = True
-        w_ok = True
-        h_ok = True
-        if not eqn.endswith("FR"):
-            l_ok = pack_rule.dim_l_norm_m <= 12.03
-            w_ok = pack_rule.dim_w_norm_m <= 2.35
-            h_ok = pack_rule.dim_h_norm_m <= 2.39
-        over_h = not h_ok
-        over_w = not w_ok
-        return {
-            "flatrack": eqn.endswith("FR"),
-            "over_height": over_h,
-            "over_width": over_w,
-            "over_height_width": over_h and over_w,
-        }
-
-    def _leg(mode: str, equipment: str, scope: str, o_type: str, o_code: str, d_type: str, d_code: str, leg_miles: float | None, containers_count: float, chargeable: float, flags: dict):
+        if eqn not in flags_by_eq:
+            flatrack = eqn.endswith("FR")
+            over_h = pack_over_h and not flatrack
+            over_w = pack_over_w and not flatrack
+            flags_by_eq[eqn] = {
+                "flatrack": flatrack,
+                "over_height": over_h,
+                "over_width": over_w,
+                "over_height_width": over_h and over_w,
+            }
+        return flags_by_eq[eqn]
+
+    def _leg(mode: str, equipment: str, scope: str, o_type: str, o_code: str, d_type: str, d_code: str, leg_miles: float | None, containers_count: float, chargeable: float, flags: Mapping[str, bool]):
+        # Callers pass upper-case mode, equipment, scope, types and codes.
         shipment = RateTestInput(
             ship_date=ship_by,
-            mode=mode.upper(),
-            equipment=equipment.upper(),
-            service_scope=scope.upper(),
-            origin_type=o_type.upper(),
-            origin_code=(o_code or "").upper(),
-            dest_type=d_type.upper(),
-            dest_code=(d_code or "").upper(),
+            mode=mode,
+            equipment=equipment,
+            service_scope=scope,
+            origin_type=o_type,
+            origin_code=o_code,
+            dest_type=d_type,
+            dest_code=d_code,
             weight_kg=total_weight,
             volume_m3=total_volume,
             miles=leg_miles,
@@ -193,31 +273,24 @@ def recommend_modes(
             chargeable_weight_kg=chargeable,
             **flags,
         )
-        if not rate_cards:
-            return None
-        card = select_best_rate_card(rate_cards, shipment)
+        card = select_best_rate_card(cards_by_lane.get(shipment_lane_key(shipment), []), shipment)
         if not card:
             return None
-        result = compute_rate_total(card, rate_charges or [], shipment)
+        result = compute_rate_total(card, charges_by_card.get(int(card.get("id") or 0), []), shipment)
         return card, result
     for mode, equipments in equipment_by_mode.items():
-        mode = norm_mode(mode)
-        lead_days = lead_days_for(mode, coo, sku_id, lead_table, sku_lead_override, manual_lead_override)
+        lead_days = lead_days_by_mode[mode]
         ship_by = need_date - timedelta(days=lead_days)
         feasible = lead_days < 900
         cost = 0.0
         eq_count = 0
         util = 0.0
+        chargeable = total_weight
 
         if mode == "AIR":
             eq = equipments[0]
             chargeable = chargeable_air_weight_kg(total_weight, total_volume, eq.volumetric_factor or 167)
-            rate = next((
-                r for r in rates
-                if norm_mode(r.get("mode")) == "AIR"
-                and str(r.get("pricing_model", "")).lower() == "per_kg"
-                and (not r.get("equipment_name") or norm_equipment_code(r.get("equipment_name")) == norm_equipment_code(eq.name))
-            ), None)
+            rate = _first_rate(rate_index, [("AIR", "per_kg", norm_equipment_code(eq.name)), ("AIR", "per_kg", "")])
             if rate:
                 cost = max(rate["minimum_charge"] or 0, chargeable * rate["rate_value"]) + (rate["fixed_fee"] or 0)
             eq_count = 1
@@ -249,12 +322,8 @@ def recommend_modes(
             )
             packs_fit = int(fit["max_units"])
             eq_count = equipment_count_for_packs(total_packs, packs_fit)
-            rate = next((
-                r for r in rates
-                if norm_mode(r.get("mode")) == mode
-                and norm_equipment_code(r.get("equipment_name")) == norm_equipment_code(eq.name)
-                and str(r.get("pricing_model", "")).lower() in {"per_container", "per_load"}
-            ), None)
+            eq_code = norm_equipment_code(eq.name)
+            rate = _first_rate(rate_index, [(mode, "per_container", eq_code), (mode, "per_load", eq_code)])
             if rate:
                 cost = eq_count * rate["rate_value"] + (rate["fixed_fee"] or 0) + (rate["surcharge"] or 0)
             util = min(1.0, max(total_volume / (eq_count * eq.volume_m3), total_weight / (eq_count * eq.max_payload_kg))) if eq_count else 0
@@ -263,19 +332,19 @@ def recommend_modes(
         card_id = None
         main_cost = cost
         domestic_cost = 0.0
-        if rate_cards and has_route:
+        if price_legs:
             flags = _flags(eq.name)
             main_leg = _leg(
                 mode,
-                eq.name,
-                service_scope,
-                "PORT" if service_scope.startswith("P") else "CITY",
-                origin_port if service_scope.startswith("P") else supplier_loc,
-                "PORT" if service_scope.endswith("P") else "CITY",
-                dest_port if service_scope.endswith("P") else plant_loc,
+                eq.name.upper(),
+                scope_key,
+                main_o_type,
+                main_o_code,
+                main_d_type,
+                main_d_code,
                 miles if mode == "TRUCK" else None,
                 float(eq_count or 1),
-                chargeable_air_weight_kg(total_weight, total_volume, eq.volumetric_factor or 167) if mode == "AIR" else total_weight,
+                chargeable,
                 flags,
             )
             if main_leg:
@@ -283,14 +352,14 @@ def recommend_modes(
                 card_id = card.get("id")
                 main_cost = float(result["grand_total"])
                 details.extend(result["items"])
-            if service_scope in {"P2D", "D2D"}:
-                truck_leg = _leg("TRUCK", "TRL_53_STD", "D2D", "CITY", dest_port, "CITY", plant_loc, miles, 1.0, total_weight, {"flatrack": False, "over_height": False, "over_width": False, "over_height_width": False})
+            if needs_dest_truck:
+                truck_leg = _leg("TRUCK", "TRL_53_STD", "D2D", "CITY", dest_port_key, "CITY", plant_loc_key, miles, 1.0, total_weight, _DOMESTIC_TRUCK_FLAGS)
                 if truck_leg:
                     _, result = truck_leg
                     domestic_cost += float(result["grand_total"])
                     details.extend(result["items"])
-            if service_scope in {"D2P", "D2D"}:
-                truck_leg = _leg("TRUCK", "TRL_53_STD", "D2D", "CITY", supplier_loc, "CITY", origin_port, miles, 1.0, total_weight, {"flatrack": False, "over_height": False, "over_width": False, "over_height_width": False})
+            if needs_origin_truck:
+                truck_leg = _leg("TRUCK", "TRL_53_STD", "D2D", "CITY", supplier_loc_key, "CITY", origin_port_key, miles, 1.0, total_weight, _DOMESTIC_TRUCK_FLAGS)
                 if truck_leg:
                     _, result = truck_leg
                     domestic_cost += float(result["grand_total"])
@@ -331,21 +400,34 @@ def recommend_modes(
             }
         )
 
-    recs.sort(key=lambda r: (not r["feasible"], r["estimated_cost"]))
+    if top_n is not None and top_n < len(recs):
+        return heapq.nsmallest(top_n, recs, key=_rec_sort_key)
+    recs.sort(key=_rec_sort_key)
     return recs
 
 
 def build_shipments(tranches: list[dict], equipment_map: dict[str, Equipment]):
-    grouped = defaultdict(list)
     normalized_eq = {norm_mode(k): v for k, v in equipment_map.items()}
+    # One pass over the rows, keeping running per-mode totals instead of
+    # grouping rows into lists and re-walking each list for every total.
+    totals: dict[str, dict] = {}
     for row in tranches:
-        grouped[norm_mode(row["mode"])].append(row)
+        mode = norm_mode(row["mode"])
+        acc = totals.get(mode)
+        if acc is None:
+            totals[mode] = {"volume": row["volume_m3"], "weight": row["weight_kg"], "cost": row["cost"], "ship_by": row["ship_by"]}
+            continue
+        acc["volume"] += row["volume_m3"]
+        acc["weight"] += row["weight_kg"]
+        acc["cost"] += row["cost"]
+        if row["ship_by"] < acc["ship_by"]:
+            acc["ship_by"] = row["ship_by"]
 
     outputs = []
-    for mode, rows in grouped.items():
+    for mode, acc in totals.items():
         eq = normalized_eq[mode]
-        total_volume = sum(r["volume_m3"] for r in rows)
-        total_weight = sum(r["weight_kg"] for r in rows)
+        total_volume = acc["volume"]
+        total_weight = acc["weight"]
         by_volume = ceil(total_volume / eq.volume_m3) if eq.volume_m3 else 0
         by_weight = ceil(total_weight / eq.max_payload_kg) if eq.max_payload_kg else 0
         count = max(1, by_volume, by_weight) if (by_volume or by_weight) else 0
@@ -358,8 +440,8 @@ def build_shipments(tranches: list[dict], equipment_map: dict[str, Equipment]):
                 "mode": mode,
                 "shipments": count,
                 "utilization_pct": round(min(1.0, utilization) * 100, 1),
-                "ship_by_date": min(r["ship_by"] for r in rows),
-                "cost": round(sum(r["cost"] for r in rows), 2),
+                "ship_by_date": acc["ship_by"],
+                "cost": round(acc["cost"], 2),
                 "fit_diagnostics": {
                     "engine": "volume_weight_rollup",
                     "api": "build_shipments",
@@ -370,46 +452,84 @@ def build_shipments(tranches: list[dict], equipment_map: dict[str, Equipment]):
     return outputs
 
 
+_NO_SKU: dict = {}
+# Customs tables reuse a small set of effective-date strings across rows and reports.
+_parse_iso_date = lru_cache(maxsize=1024)(date.fromisoformat)
+
+
 def customs_report(shipments: list[dict], sku_rows: list[dict], customs_rates: list[dict], as_of: date | None = None) -> list[dict]:
     as_of = as_of or date.today()
-    sku_ix = {(r.get("sku_id"), r.get("part_number")): r for r in sku_rows}
+    sku_ix: dict[object, dict[object, dict]] = {}
+    for r in sku_rows:
+        sku_ix.setdefault(r.get("part_number"), {})[r.get("sku_id")] = r
+    rates_by_hts: dict[object, list[dict]] = defaultdict(list)
+    for r in customs_rates:
+        rates_by_hts[r.get("hts_code")].append(r)
+    # Effective windows are parsed once per HTS code, the first time a shipment needs them,
+    # and kept newest-first so the latest rate covering as_of wins.
+    windows_by_hts: dict[object, list[tuple[date, date | None, dict]]] = {}
+    # as_of is fixed for the whole report, so the chosen rate only depends on (hts, coo).
+    chosen_by_key: dict[tuple[object, object], dict | None] = {}
     out: list[dict] = []
     for s in shipments:
-        sku = sku_ix.get((s.get("sku_id"), s.get("part_number")), {})
-        hts = sku.get("hts_code") or s.get("hts_code")
-        coo = s.get("coo") or sku.get("default_coo")
-        matches = [r for r in customs_rates if r.get("hts_code") == hts and (r.get("country_of_origin") in {None, "", coo})]
-        chosen = None
-        for r in matches:
-            start = date.fromisoformat(r["effective_from"])
-            end = date.fromisoformat(r["effective_to"]) if r.get("effective_to") else None
-            if as_of >= start and (end is None or as_of <= end):
-                chosen = r
-                break
-        declared_value = float(s.get("declared_value") or (s.get("qty", 0) * s.get("unit_price", 0)))
-        base = float(chosen.get("base_duty_rate") or 0) if chosen else 0.0
-        tariff = float(chosen.get("tariff_rate") or 0) if chosen else 0.0
+        get = s.get
+        sku = sku_ix.get(get("part_number"), _NO_SKU).get(get("sku_id"), _NO_SKU)
+        hts = sku.get("hts_code") or get("hts_code")
+        coo = get("coo") or sku.get("default_coo")
+        key = (hts, coo)
+        if key in chosen_by_key:
+            chosen = chosen_by_key[key]
+        else:
+            windows = windows_by_hts.get(hts)
+            if windows is None:
+                windows = windows_by_hts[hts] = [
+                    (
+                        _parse_iso_date(r["effective_from"]),
+                        _parse_iso_date(r["effective_to"]) if r.get("effective_to") else None,
+                        r,
+                    )
+                    for r in rates_by_hts.get(hts, ())
+                ]
+                windows.sort(key=lambda w: w[0], reverse=True)
+            origin_ok = {None, "", coo}
+            chosen = None
+            for start, end, r in windows:
+                if r.get("country_of_origin") in origin_ok and as_of >= start and (end is None or as_of <= end):
+                    chosen = r
+                    break
+            chosen_by_key[key] = chosen
+        qty = get("qty", 0)
+        declared_value = float(get("declared_value") or (qty * get("unit_price", 0)))
+        if chosen:
+            base = float(chosen.get("base_duty_rate") or 0)
+            tariff = float(chosen.get("tariff_rate") or 0)
+            section_232 = int(chosen.get("section_232") or 0)
+            section_301 = int(chosen.get("section_301") or 0)
+        else:
+            base = tariff = 0.0
+            section_232 = section_301 = 0
         duty = declared_value * (base + tariff) / 100
+        weight = get("weight_kg", 0)
         out.append({
-            "phase": s.get("phase", ""),
-            "part_number": s.get("part_number", ""),
-            "supplier": s.get("supplier_code", ""),
+            "phase": get("phase", ""),
+            "part_number": get("part_number", ""),
+            "supplier": get("supplier_code", ""),
             "hts_code": hts,
             "coo": coo,
-            "quantity": s.get("qty", 0),
-            "gross_weight": s.get("gross_weight_kg", s.get("weight_kg", 0)),
-            "net_weight": s.get("net_weight_kg", s.get("weight_kg", 0)),
+            "quantity": qty,
+            "gross_weight": get("gross_weight_kg", weight),
+            "net_weight": get("net_weight_kg", weight),
             "declared_value": round(declared_value, 2),
             "base_duty_rate": base,
             "tariff_rate": tariff,
-            "section_232": int(chosen.get("section_232") or 0) if chosen else 0,
-            "section_301": int(chosen.get("section_301") or 0) if chosen else 0,
+            "section_232": section_232,
+            "section_301": section_301,
             "duty_amount": round(duty, 2),
-            "port": s.get("port", s.get("dest_port", "")),
-            "importer": s.get("importer", ""),
-            "exporter": s.get("exporter", ""),
-            "incoterms": s.get("incoterms", ""),
-            "plant": s.get("plant", ""),
+            "port": get("port", get("dest_port", "")),
+            "importer": get("importer", ""),
+            "exporter": get("exporter", ""),
+            "incoterms": get("incoterms", ""),
+            "plant": get("plant", ""),
         })
     return out
 
@@ -421,23 +541,29 @@ def phase_cost_rollup(shipments: list[dict], customs_rows: list[dict]) -> list[d
     bucket: dict[str, dict] = {}
     for s in shipments:
         ph = str(s.get("phase", ""))
-        rec = bucket.setdefault(ph, {"phase": ph, "total_cost": 0.0, "weight": 0.0, "volume": 0.0, "modes": set(), "arrivals": []})
+        rec = bucket.setdefault(ph, {"phase": ph, "total_cost": 0.0, "weight": 0.0, "volume": 0.0, "modes": [], "eta_min": None, "eta_max": None})
         rec["total_cost"] += float(s.get("base_cost", s.get("estimated_cost", 0))) + float(s.get("domestic_legs_cost", 0))
         rec["weight"] += float(s.get("weight_kg", 0))
         rec["volume"] += float(s.get("volume_m3", 0))
-        rec["modes"].add(str(s.get("mode", "")))
-        if s.get("arrival_date"):
-            rec["arrivals"].append(s["arrival_date"])
+        mode = str(s.get("mode", ""))
+        if mode and mode not in rec["modes"]:
+            rec["modes"].append(mode)
+        arrival = s.get("arrival_date")
+        if arrival:
+            if rec["eta_min"] is None or arrival < rec["eta_min"]:
+                rec["eta_min"] = arrival
+            if rec["eta_max"] is None or arrival > rec["eta_max"]:
+                rec["eta_max"] = arrival
     rows = []
     for ph, rec in bucket.items():
         total = rec["total_cost"] + duty_by_phase.get(ph, 0.0)
         rows.append({
             "phase": ph,
-            "mode_mix": ",".join(sorted(m for m in rec["modes"] if m)),
+            "mode_mix": ",".join(sorted(rec["modes"])),
             "total_cost": round(total, 2),
             "cost_per_kg": round(total / rec["weight"], 4) if rec["weight"] else 0,
             "cost_per_m3": round(total / rec["volume"], 4) if rec["volume"] else 0,
-            "eta_min": min(rec["arrivals"]) if rec["arrivals"] else "",
-            "eta_max": max(rec["arrivals"]) if rec["arrivals"] else "",
+            "eta_min": rec["eta_min"] if rec["eta_min"] is not None else "",
+            "eta_max": rec["eta_max"] if rec["eta_max"] is not None else "",
         })
     return sorted(rows, key=lambda r: r["phase"])
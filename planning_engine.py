@@ -2,28 +2,35 @@
 from __future__ import annotations
 
 import sqlite3
+import sys
+from collections import defaultdict
 from datetime import date, timedelta
+from functools import lru_cache
+from operator import itemgetter
 from typing import Any
 
 from constraints_engine import max_units_per_conveyance
 from fit_engine import (
-    equipment_capacity,
     equipment_count_for_packs,
     pack_gross_kg,
     pack_volume_m3,
     required_shipped_units,
     utilization,
 )
-from rate_engine import RateTestInput, compute_rate_total, select_best_rate_card
+from rate_engine import RateTestInput, compute_rate_total, index_charges, select_best_rate_card
 from db import get_sku_routing_context
 
 
+# Both normalisers see the same handful of raw strings for every card, rate and preset row.
+# Caching skips the strip/upper work, and interning lets key comparisons short-circuit on identity.
+@lru_cache(maxsize=256)
 def norm_mode(mode: str | None) -> str:
-    return (mode or "").strip().upper()
+    return sys.intern((mode or "").strip().upper())
 
 
+@lru_cache(maxsize=512)
 def norm_equipment_code(code: str | None) -> str:
-    return (code or "").strip().upper()
+    return sys.intern((code or "").strip().upper())
 
 
 
@@ -53,13 +60,10 @@ def _legacy_rate_total(rate_row: dict[str, Any], *, equipment_count: int, shippe
     return round(total + fixed_fee + surcharge, 2)
 
 
-def _carrier_name(conn: sqlite3.Connection, carrier_id: int | None) -> str | None:
+def _carrier_name(carriers: dict[int, str], carrier_id: int | None) -> str | None:
     if not carrier_id:
         return None
-    row = conn.execute("SELECT code, name FROM carrier WHERE id = ?", (carrier_id,)).fetchone()
-    if not row:
-        return None
-    return row["code"] or row["name"]
+    return carriers.get(carrier_id)
 
 
 def plan_quick_run(
@@ -94,21 +98,17 @@ def plan_quick_run(
     ship_to_candidates = [str(v).strip().upper() for v in routing_context.get("ship_to_locations", []) if str(v).strip()]
     ship_from_origin = (routing_context.get("ship_from_origin_code") or "").strip().upper()
 
-    if pack_rule_id:
-        pack_rule_row = conn.execute(
-            "SELECT * FROM packaging_rules WHERE id = ? AND sku_id = ?",
-            (pack_rule_id, sku_id),
-        ).fetchone()
-    else:
-        pack_rule_row = conn.execute(
-            """
-            SELECT * FROM packaging_rules
-            WHERE sku_id = ?
-            ORDER BY is_default DESC, id ASC
-            LIMIT 1
-            """,
-            (sku_id,),
-        ).fetchone()
+    # An explicit pack_rule_id must match exactly; otherwise fall back to the SKU's default rule.
+    pack_rule_id = pack_rule_id or None
+    pack_rule_row = conn.execute(
+        """
+        SELECT * FROM packaging_rules
+        WHERE sku_id = ? AND (? IS NULL OR id = ?)
+        ORDER BY is_default DESC, id ASC
+        LIMIT 1
+        """,
+        (sku_id, pack_rule_id, pack_rule_id),
+    ).fetchone()
     if not pack_rule_row:
         raise ValueError("No packaging rule found for selected SKU")
 
@@ -126,58 +126,124 @@ def plan_quick_run(
     requested_modes = {norm_mode(m) for m in (modes or []) if norm_mode(m)}
     if allowed_modes:
         requested_modes = requested_modes & allowed_modes if requested_modes else set(allowed_modes)
-    eq_rows = conn.execute("SELECT * FROM equipment_presets WHERE active = 1 ORDER BY mode, equipment_code").fetchall()
+    # Join the SKU's conveyance restrictions onto the presets and iterate the cursor directly;
+    # presets without a rule are allowed.
     try:
-        restriction_rows = conn.execute(
-            "SELECT equipment_id, allowed FROM sku_equipment_rules WHERE sku_id = ?",
+        eq_rows = conn.execute(
+            """
+            SELECT ep.*, COALESCE(r.allowed, 1) AS sku_allowed
+            FROM equipment_presets ep
+            LEFT JOIN sku_equipment_rules r ON r.equipment_id = ep.id AND r.sku_id = ?
+            WHERE ep.active = 1
+            ORDER BY ep.mode, ep.equipment_code
+            """,
             (sku_id,),
-        ).fetchall()
+        )
     except sqlite3.OperationalError:
-        restriction_rows = []
-    restrictions = {int(r["equipment_id"]): int(r["allowed"]) for r in restriction_rows}
+        eq_rows = conn.execute(
+            "SELECT *, 1 AS sku_allowed FROM equipment_presets WHERE active = 1 ORDER BY mode, equipment_code"
+        )
 
     equipment_results: list[dict[str, Any]] = []
+    # Sort keys are collected alongside the results so the final sort needs no per-row lambda.
+    equipment_sort_keys: list[tuple[str, int, str, str]] = []
     excluded_equipment: list[dict[str, Any]] = []
     mode_rollup: dict[str, dict[str, Any]] = {}
-    rate_breakdown: dict[str, list[dict[str, Any]]] = {}
+    rate_breakdown: defaultdict[str, list[dict[str, Any]]] = defaultdict(list)
     need_dt = date.fromisoformat(need_date)
 
     cards = [dict(r) for r in conn.execute("SELECT * FROM rate_card WHERE is_active = 1").fetchall()]
-    charges = [dict(r) for r in conn.execute("SELECT * FROM rate_charge").fetchall()]
+    # Only charges on active cards can be priced, so don't copy the rest out of SQLite.
+    charges_by_card = index_charges(
+        [
+            dict(r)
+            for r in conn.execute(
+                "SELECT ch.* FROM rate_charge ch JOIN rate_card c ON c.id = ch.rate_card_id WHERE c.is_active = 1"
+            ).fetchall()
+        ]
+    )
     rates = [dict(r) for r in conn.execute("SELECT * FROM rates").fetchall()]
+    carriers = {row["id"]: row["code"] or row["name"] for row in conn.execute("SELECT id, code, name FROM carrier")}
+    # Index cards by (mode, equipment, scope) and rates by (mode, equipment), with
+    # None for rates that apply to any equipment, so each equipment row does hash probes.
+    # Also record which (origin_type, dest_type) pairs each key has cards for, so
+    # the CITY/PORT passes below only run for pairs that can match.
+    cards_index: dict[tuple[str, str, str], list[dict[str, Any]]] = {}
+    endpoint_pairs_by_key: dict[tuple[str, str, str], set[tuple[str, str]]] = {}
+    for c in cards:
+        key = (norm_mode(c.get("mode")), norm_equipment_code(c.get("equipment")), str(c.get("service_scope") or "").strip().upper())
+        cards_index.setdefault(key, []).append(c)
+        endpoint_pairs_by_key.setdefault(key, set()).add(
+            ((c.get("origin_type") or "").upper(), (c.get("dest_type") or "").upper())
+        )
+    rates_index: dict[tuple[str, str | None], list[dict[str, Any]]] = {}
+    for r in rates:
+        key = (norm_mode(r.get("mode")), norm_equipment_code(r.get("equipment_name")) if r.get("equipment_name") else None)
+        rates_index.setdefault(key, []).append(r)
+    scope_norm = (service_scope or "P2P").upper()
+
+    # Lead times only vary by mode here, so fetch SKU overrides and COO base lead times in one
+    # query. Overrides sort ahead of base rows, each in id order, and the first row per mode wins.
+    lead_by_mode: dict[str, int] = {}
+    for row in conn.execute(
+        """
+        SELECT UPPER(mode) AS mode, lead_days, 0 AS source, id FROM lead_time_overrides WHERE sku_id = ?
+        UNION ALL
+        SELECT UPPER(mode) AS mode, lead_days, 1 AS source, id FROM lead_times WHERE UPPER(country_of_origin) = ?
+        ORDER BY source, id
+        """,
+        (sku_id, coo),
+    ):
+        lead_by_mode.setdefault(row["mode"], int(row["lead_days"]))
+    ship_by_by_mode = {m: (need_dt - timedelta(days=d)).isoformat() for m, d in lead_by_mode.items()}
 
     selected_jurisdiction = (jurisdiction_code or "US_FED_INTERSTATE").strip().upper()
     selected_truck_config = (truck_config_code or "5AXLE_TL").strip().upper()
 
+    # Fetch the selected row and its default fallback in one query, preferring the selected code.
     jurisdiction_rule = conn.execute(
-        "SELECT * FROM jurisdiction_weight_rules WHERE jurisdiction_code = ? AND active = 1",
-        (selected_jurisdiction,),
+        """
+        SELECT * FROM jurisdiction_weight_rules
+        WHERE jurisdiction_code IN (?, 'US_FED_INTERSTATE') AND active = 1
+        ORDER BY (jurisdiction_code = ?) DESC
+        LIMIT 1
+        """,
+        (selected_jurisdiction, selected_jurisdiction),
     ).fetchone()
-    if not jurisdiction_rule:
-        jurisdiction_rule = conn.execute(
-            "SELECT * FROM jurisdiction_weight_rules WHERE jurisdiction_code = 'US_FED_INTERSTATE' AND active = 1"
-        ).fetchone()
 
     truck_config = conn.execute(
-        "SELECT * FROM truck_configs WHERE truck_config_code = ? AND active = 1",
-        (selected_truck_config,),
+        """
+        SELECT * FROM truck_configs
+        WHERE truck_config_code IN (?, '5AXLE_TL') AND active = 1
+        ORDER BY (truck_config_code = ?) DESC
+        LIMIT 1
+        """,
+        (selected_truck_config, selected_truck_config),
     ).fetchone()
     truck_warning = None
-    if not truck_config:
+    if not truck_config or truck_config["truck_config_code"] != selected_truck_config:
         truck_warning = "Truck config missing; using conservative default 5AXLE_TL assumptions."
-        truck_config = conn.execute(
-            "SELECT * FROM truck_configs WHERE truck_config_code = '5AXLE_TL' AND active = 1"
-        ).fetchone()
+
+    # max_units_per_conveyance only reads its context, so build the two variants once and share them.
+    base_context = {
+        "jurisdiction_code": selected_jurisdiction,
+        "truck_config_code": selected_truck_config,
+        "jurisdiction_rule": dict(jurisdiction_rule) if jurisdiction_rule else {},
+        "truck_config": dict(truck_config) if truck_config else {},
+    }
+    fit_context_by_chassis = {
+        on_chassis: {**base_context, "container_on_chassis": on_chassis} for on_chassis in (False, True)
+    }
 
     for eq_row in eq_rows:
-        eq = dict(eq_row)
-        mode = norm_mode(eq.get("mode"))
+        # Filter on the raw row first; only presets that get planned are copied into a dict.
+        mode = norm_mode(eq_row["mode"])
         if allowed_modes and mode not in allowed_modes:
             excluded_equipment.append(
                 {
                     "mode": mode,
-                    "equipment_name": eq.get("name"),
-                    "equipment_code": eq.get("equipment_code"),
+                    "equipment_name": eq_row["name"],
+                    "equipment_code": eq_row["equipment_code"],
                     "reason": "Disallowed by SKU allowed_modes",
                 }
             )
@@ -185,33 +251,28 @@ def plan_quick_run(
         if requested_modes and mode not in requested_modes:
             continue
 
-        eq_allowed = bool(restrictions.get(int(eq.get("id")), 1)) if restrictions else True
-        if not eq_allowed:
+        if not eq_row["sku_allowed"]:
             excluded_equipment.append(
                 {
                     "mode": mode,
-                    "equipment_name": eq.get("name"),
-                    "equipment_code": eq.get("equipment_code"),
+                    "equipment_name": eq_row["name"],
+                    "equipment_code": eq_row["equipment_code"],
                     "reason": "Disallowed by SKU conveyance restrictions",
                 }
             )
             continue
+        eq = dict(eq_row)
+        del eq["sku_allowed"]
 
         try:
             fit = max_units_per_conveyance(
                 sku_id=sku_id,
                 pack_rule=pack_rule,
                 equipment=eq,
-                context={
-                    "jurisdiction_code": selected_jurisdiction,
-                    "truck_config_code": selected_truck_config,
-                    "jurisdiction_rule": dict(jurisdiction_rule) if jurisdiction_rule else {},
-                    "truck_config": dict(truck_config) if truck_config else {},
-                    "container_on_chassis": mode in {"TRUCK", "DRAY"},
-                },
+                context=fit_context_by_chassis[mode in {"TRUCK", "DRAY"}],
             )
             packs_fit = int(fit["max_units"])
-            caps = equipment_capacity(eq)
+            caps = fit["capacity"]
         except ValueError as exc:
             excluded_equipment.append(
                 {
@@ -238,14 +299,17 @@ def plan_quick_run(
         est_cost = None
         carrier_best = None
 
+        eq_code_norm = norm_equipment_code(eq.get("equipment_code") or eq.get("name"))
         effective_origin = (lane_origin_code or ship_from_origin or "").strip().upper()
         effective_dest = (lane_dest_code or (ship_to_candidates[0] if ship_to_candidates else "")).strip().upper()
-        if effective_origin and effective_dest and cards:
+        card_key = (mode, eq_code_norm, scope_norm)
+        endpoint_pairs = [p for p in (("CITY", "CITY"), ("PORT", "PORT")) if p in endpoint_pairs_by_key.get(card_key, ())]
+        if effective_origin and effective_dest and endpoint_pairs:
             shipment = RateTestInput(
                 ship_date=need_dt,
                 mode=mode,
-                equipment=norm_equipment_code(eq.get("equipment_code") or eq.get("name") or ""),
-                service_scope=(service_scope or "P2P").upper(),
+                equipment=eq_code_norm,
+                service_scope=scope_norm,
                 origin_type="CITY",
                 origin_code=effective_origin,
                 dest_type="CITY",
@@ -255,29 +319,24 @@ def plan_quick_run(
                 volume_m3=shipped_volume,
                 chargeable_weight_kg=shipped_weight,
             )
-            candidate_cards = [
-                c for c in cards
-                if norm_mode(c.get("mode")) == mode
-                and norm_equipment_code(c.get("equipment")) == norm_equipment_code(eq.get("equipment_code") or eq.get("name"))
-                and str(c.get("service_scope") or "").strip().upper() == shipment.service_scope
-            ]
+            candidate_cards = cards_index[card_key]
             # try exact CITY/CITY first, then PORT/PORT fallback.
             best_result = None
             best_card = None
-            for origin_type, dest_type in [("CITY", "CITY"), ("PORT", "PORT")]:
+            for origin_type, dest_type in endpoint_pairs:
                 shipment.origin_type = origin_type
                 shipment.dest_type = dest_type
                 card = select_best_rate_card(candidate_cards, shipment)
                 if not card:
                     continue
-                result = compute_rate_total(card, charges, shipment)
+                result = compute_rate_total(card, charges_by_card.get(int(card["id"]), []), shipment)
                 if best_result is None or float(result["grand_total"]) < float(best_result["grand_total"]):
                     best_result = result
                     best_card = card
             if best_card and best_result:
                 est_cost = float(best_result["grand_total"])
-                carrier_best = _carrier_name(conn, best_card.get("carrier_id"))
-                rate_breakdown.setdefault(mode, []).append(
+                carrier_best = _carrier_name(carriers, best_card.get("carrier_id"))
+                rate_breakdown[mode].append(
                     {
                         "equipment_name": eq.get("name"),
                         "equipment_code": eq.get("equipment_code"),
@@ -289,25 +348,21 @@ def plan_quick_run(
                 )
 
         if est_cost is None:
-            matching_rates = [
-                r for r in rates
-                if norm_mode(r.get("mode")) == mode
-                and (
-                    (not r.get("equipment_name"))
-                    or norm_equipment_code(r.get("equipment_name")) == norm_equipment_code(eq.get("equipment_code") or eq.get("name"))
-                )
-            ]
-            if matching_rates:
-                est_cost = min(
-                    _legacy_rate_total(
+            matching_rates = rates_index.get((mode, eq_code_norm), []) + rates_index.get((mode, None), [])
+            for r in matching_rates:
+                if not (r.get("rate_value") or r.get("fixed_fee") or r.get("surcharge")) and r.get("minimum_charge") is None:
+                    # Nothing to price: the total is zero whatever the pricing model.
+                    total = 0.0
+                else:
+                    total = _legacy_rate_total(
                         r,
                         equipment_count=equipment_count,
                         shipped_units=shipped_units,
                         shipped_weight_kg=shipped_weight,
                         shipped_volume_m3=shipped_volume,
                     )
-                    for r in matching_rates
-                )
+                if est_cost is None or total < est_cost:
+                    est_cost = total
 
         equipment_results.append(
             {
@@ -323,43 +378,34 @@ def plan_quick_run(
                 "equipment_count": equipment_count,
                 "cube_util": util["cube_util"],
                 "weight_util": util["weight_util"],
+                "cube_util_pct": round(util["cube_util"] * 100, 1),
+                "weight_util_pct": round(util["weight_util"] * 100, 1),
                 "pack_utilization": util["pack_utilization"],
                 "est_cost": est_cost,
                 "carrier_best": carrier_best,
             }
         )
+        equipment_sort_keys.append((mode, equipment_count, eq.get("equipment_code") or "", eq.get("name") or ""))
 
-        lead_override = conn.execute(
-            "SELECT lead_days FROM lead_time_overrides WHERE sku_id = ? AND UPPER(mode) = ?",
-            (sku_id, mode),
-        ).fetchone()
-        lead_base = conn.execute(
-            "SELECT lead_days FROM lead_times WHERE UPPER(country_of_origin) = ? AND UPPER(mode) = ?",
-            (coo, mode),
-        ).fetchone()
-        lead_days = int(lead_override["lead_days"]) if lead_override else (int(lead_base["lead_days"]) if lead_base else None)
-        ship_by_date = (need_dt - timedelta(days=lead_days)).isoformat() if lead_days is not None else None
-
-        roll = mode_rollup.setdefault(
-            mode,
-            {
+        # Lead days and ship-by dates are fixed per mode, so they are only set when the mode's
+        # rollup is first created; later rows only compete on cost.
+        roll = mode_rollup.get(mode)
+        if roll is None:
+            roll = mode_rollup[mode] = {
                 "mode": mode,
-                "lead_days": lead_days,
-                "ship_by_date": ship_by_date,
+                "lead_days": lead_by_mode.get(mode),
+                "ship_by_date": ship_by_by_mode.get(mode),
                 "cost_best": None,
                 "carrier_best": None,
-            },
-        )
-        if roll["lead_days"] is None and lead_days is not None:
-            roll["lead_days"] = lead_days
-            roll["ship_by_date"] = ship_by_date
+            }
 
-        if est_cost is not None and (roll["cost_best"] is None or float(est_cost) < float(roll["cost_best"])):
+        if est_cost is not None and (roll["cost_best"] is None or est_cost < roll["cost_best"]):
             roll["cost_best"] = est_cost
             roll["carrier_best"] = carrier_best
 
-    equipment_results.sort(key=lambda r: (r["mode"], r["equipment_count"], r.get("equipment_code") or "", r["equipment_name"] or ""))
-    mode_summary = sorted(mode_rollup.values(), key=lambda r: r["mode"])
+    order = sorted(range(len(equipment_results)), key=equipment_sort_keys.__getitem__)
+    equipment_results = [equipment_results[i] for i in order]
+    mode_summary = sorted(mode_rollup.values(), key=itemgetter("mode"))
 
     return {
         "sku": {
@@ -375,7 +421,7 @@ def plan_quick_run(
         "excess_units": excess_units,
         "equipment": equipment_results,
         "mode_summary": mode_summary,
-        "rate_breakdown": rate_breakdown,
+        "rate_breakdown": dict(rate_breakdown),
         "excluded_equipment": sorted(excluded_equipment, key=lambda r: (r["mode"], r.get("equipment_code") or "", r["equipment_name"] or "")),
         "warnings": [w for w in [truck_warning] if w],
         "routing_context": {
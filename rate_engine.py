@@ -1,8 +1,10 @@
 """Master rate engine with effective dating and accessorial calculations."""
 from __future__ import annotations
 
+import sys
 from dataclasses import dataclass
 from datetime import date
+from functools import lru_cache
 
 
 SPECIFICITY_SCORES = {
@@ -37,12 +39,16 @@ class RateTestInput:
     chargeable_weight_kg: float | None = None
 
 
+# Card and charge dates repeat across every shipment priced in a run; parse each string once.
+_parse_iso_date = lru_cache(maxsize=1024)(date.fromisoformat)
+
+
 def _is_date_valid(ship_date: date, effective_from: str, effective_to: str | None) -> bool:
-    start = date.fromisoformat(effective_from)
+    start = _parse_iso_date(effective_from)
     if ship_date < start:
         return False
     if effective_to:
-        end = date.fromisoformat(effective_to)
+        end = _parse_iso_date(effective_to)
         return ship_date <= end
     return True
 
@@ -51,41 +57,47 @@ def _specificity_score(row: dict) -> int:
     return SPECIFICITY_SCORES.get((row.get("origin_type") or "").upper(), 0) + SPECIFICITY_SCORES.get((row.get("dest_type") or "").upper(), 0)
 
 
+# applies_when flag -> RateTestInput attribute that must be set; unknown flags never apply.
+CHARGE_FLAG_ATTRS = {
+    "FR_ONLY": "flatrack",
+    "FLATRACK_ONLY": "flatrack",
+    "REEFER_ONLY": "reefer",
+    "OH_ONLY": "over_height",
+    "OW_ONLY": "over_width",
+    "OHW_ONLY": "over_height_width",
+    "DG_ONLY": "dg",
+}
+
+
 def _charge_flag_applies(flag: str, shipment: RateTestInput) -> bool:
     flag = (flag or "ALWAYS").strip().upper()
     if flag == "ALWAYS":
         return True
-    if flag in {"FR_ONLY", "FLATRACK_ONLY"}:
-        return shipment.flatrack
-    if flag == "REEFER_ONLY":
-        return shipment.reefer
-    if flag == "OH_ONLY":
-        return shipment.over_height
-    if flag == "OW_ONLY":
-        return shipment.over_width
-    if flag == "OHW_ONLY":
-        return shipment.over_height_width
-    if flag == "DG_ONLY":
-        return shipment.dg
-    return False
+    attr = CHARGE_FLAG_ATTRS.get(flag)
+    return getattr(shipment, attr) if attr else False
+
+
+def _chargeable_weight(shipment: RateTestInput) -> float:
+    return shipment.chargeable_weight_kg if shipment.chargeable_weight_kg is not None else shipment.weight_kg
+
+
+# Per-unit pricing methods shared by base rates and accessorials -> billed quantity.
+_UNIT_QUANTITY = {
+    "PER_CONTAINER": lambda shipment: shipment.containers_count or 0,
+    "PER_KG": _chargeable_weight,
+    "PER_CBM": lambda shipment: shipment.volume_m3,
+    "PER_MILE": lambda shipment: shipment.miles or 0,
+}
 
 
 def _calc_charge(calc_method: str, amount: float, shipment: RateTestInput, base_total: float) -> float:
     method = (calc_method or "FLAT").upper()
     if method == "FLAT":
         return amount
-    if method == "PER_CONTAINER":
-        return amount * (shipment.containers_count or 0)
-    if method == "PER_KG":
-        weight = shipment.chargeable_weight_kg if shipment.chargeable_weight_kg is not None else shipment.weight_kg
-        return amount * weight
-    if method == "PER_CBM":
-        return amount * shipment.volume_m3
-    if method == "PER_MILE":
-        return amount * (shipment.miles or 0)
     if method == "PERCENT_OF_BASE":
         return base_total * amount / 100
-    return 0.0
+    quantity = _UNIT_QUANTITY.get(method)
+    return amount * quantity(shipment) if quantity else 0.0
 
 
 def _apply_min_max(value: float, min_amount: float | None, max_amount: float | None) -> float:
@@ -99,51 +111,81 @@ def _apply_min_max(value: float, min_amount: float | None, max_amount: float | N
 def _base_total(rate_card: dict, shipment: RateTestInput) -> float:
     base_rate = float(rate_card.get("base_rate") or 0)
     uom = (rate_card.get("uom_pricing") or "FLAT").upper()
-    if uom == "PER_CONTAINER":
-        total = base_rate * (shipment.containers_count or 0)
-    elif uom in {"PER_KG", "PER_CHARGEABLE_KG"}:
-        weight = shipment.chargeable_weight_kg if shipment.chargeable_weight_kg is not None else shipment.weight_kg
-        total = base_rate * weight
-    elif uom == "PER_CBM":
-        total = base_rate * shipment.volume_m3
-    elif uom == "PER_MILE":
-        total = base_rate * (shipment.miles or 0)
-    else:
-        total = base_rate
+    # Base rates also accept PER_CHARGEABLE_KG; FLAT and unknown units price the base rate as is.
+    quantity = _UNIT_QUANTITY.get("PER_KG" if uom == "PER_CHARGEABLE_KG" else uom)
+    total = base_rate * quantity(shipment) if quantity else base_rate
     min_charge = rate_card.get("min_charge")
     if min_charge is not None:
         total = max(total, float(min_charge))
     return total
 
 
+LANE_FIELDS = ("mode", "equipment", "service_scope", "origin_type", "origin_code", "dest_type", "dest_code")
+
+
+# Lane keys are interned so bucket lookups compare the few distinct codes by identity.
+def shipment_lane_key(shipment: RateTestInput) -> tuple[str, ...]:
+    return tuple(sys.intern(getattr(shipment, field).upper()) for field in LANE_FIELDS)
+
+
+def index_rate_cards(rate_cards: list[dict]) -> dict[tuple[str, ...], list[dict]]:
+    """Group active rate cards by their exact-match lane fields.
+
+    Pass ``index.get(shipment_lane_key(shipment), [])`` to select_best_rate_card
+    to skip cards for other lanes; each bucket keeps the input order.
+    """
+    index: dict[tuple[str, ...], list[dict]] = {}
+    for row in rate_cards:
+        if not row.get("is_active"):
+            continue
+        key = tuple(sys.intern((row.get(field) or "").upper()) for field in LANE_FIELDS)
+        index.setdefault(key, []).append(row)
+    return index
+
+
+def index_charges(charges: list[dict]) -> dict[int, list[dict]]:
+    """Group accessorial charges by rate_card_id.
+
+    Pass ``index.get(int(card["id"]), [])`` to compute_rate_total so each quote
+    only walks its own card's charges; each bucket keeps the input order.
+    """
+    index: dict[int, list[dict]] = {}
+    for charge in charges:
+        index.setdefault(int(charge.get("rate_card_id") or 0), []).append(charge)
+    return index
+
+
 def select_best_rate_card(rate_cards: list[dict], shipment: RateTestInput) -> dict | None:
     candidates = []
+    ship_carrier_id = int(shipment.carrier_id) if shipment.carrier_id else None
+    mode, equipment, service_scope, origin_type, origin_code, dest_type, dest_code = shipment_lane_key(shipment)
     for row in rate_cards:
         if not row.get("is_active"):
             continue
-        if row.get("carrier_id") and shipment.carrier_id and int(row["carrier_id"]) != int(shipment.carrier_id):
+        carrier_id = row.get("carrier_id")
+        if carrier_id and ship_carrier_id and int(carrier_id) != ship_carrier_id:
             continue
-        if (row.get("mode") or "").upper() != shipment.mode.upper():
+        if (row.get("mode") or "").upper() != mode:
             continue
-        if (row.get("equipment") or "").upper() != shipment.equipment.upper():
+        if (row.get("equipment") or "").upper() != equipment:
             continue
-        if (row.get("service_scope") or "").upper() != shipment.service_scope.upper():
+        if (row.get("service_scope") or "").upper() != service_scope:
             continue
-        if (row.get("origin_type") or "").upper() != shipment.origin_type.upper():
+        if (row.get("origin_type") or "").upper() != origin_type:
             continue
-        if (row.get("origin_code") or "").upper() != shipment.origin_code.upper():
+        if (row.get("origin_code") or "").upper() != origin_code:
             continue
-        if (row.get("dest_type") or "").upper() != shipment.dest_type.upper():
+        if (row.get("dest_type") or "").upper() != dest_type:
             continue
-        if (row.get("dest_code") or "").upper() != shipment.dest_code.upper():
+        if (row.get("dest_code") or "").upper() != dest_code:
             continue
         if not _is_date_valid(shipment.ship_date, row["effective_from"], row.get("effective_to")):
             continue
         contract_start = row.get("contract_start")
         contract_end = row.get("contract_end")
-        if contract_start and shipment.ship_date < date.fromisoformat(contract_start):
+        if contract_start and shipment.ship_date < _parse_iso_date(contract_start):
             continue
-        if contract_end and shipment.ship_date > date.fromisoformat(contract_end):
+        if contract_end and shipment.ship_date > _parse_iso_date(contract_end):
             continue
         candidates.append(row)
 
@@ -155,7 +197,7 @@ def select_best_rate_card(rate_cards: list[dict], shipment: RateTestInput) -> di
         key=lambda r: (
             _specificity_score(r),
             int(r.get("priority") or 0),
-            date.fromisoformat(r["effective_from"]),
+            _parse_iso_date(r["effective_from"]),
         ),
     )
 
@@ -177,9 +219,9 @@ def compute_rate_total(rate_card: dict, charges: list[dict], shipment: RateTestI
             continue
         eff_from = charge.get("effective_from")
         eff_to = charge.get("effective_to")
-        if eff_from and shipment.ship_date < date.fromisoformat(eff_from):
+        if eff_from and shipment.ship_date < _parse_iso_date(eff_from):
             continue
-        if eff_to and shipment.ship_date > date.fromisoformat(eff_to):
+        if eff_to and shipment.ship_date > _parse_iso_date(eff_to):
             continue
         if not _charge_flag_applies(charge.get("applies_when") or "ALWAYS", shipment):
             continue
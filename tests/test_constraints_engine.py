@@ -1,4 +1,5 @@
 from constraints_engine import max_units_per_conveyance
+from fit_engine import equipment_capacity
 
 
 def test_ibc_non_stackable_40rf_floor_grid_limits_to_18():
@@ -24,6 +25,7 @@ def test_ibc_non_stackable_40rf_floor_grid_limits_to_18():
     assert result["layers_allowed"] == 1
     assert result["max_units"] == 18
     assert result["limiting_constraint"] == "FLOOR_GRID"
+    assert result["capacity"] == equipment_capacity(equipment)
 
 
 def test_dray_legal_payload_is_limiting_constraint():
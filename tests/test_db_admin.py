@@ -4,6 +4,7 @@ import pandas as pd
 
 import db
 from db import (
+    append_rows,
     clear_all_saved_data,
     compute_grid_diff,
     delete_rows,
@@ -60,6 +61,25 @@ def test_upsert_and_delete_rows():
     assert rows == [(2,)]
 
 
+def test_append_rows_batches_and_maps_missing_values_to_null():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, sku_id INTEGER, qty REAL, notes TEXT)")
+
+    frame = pd.DataFrame(
+        [
+            {"sku_id": 1, "qty": 5.0, "notes": "a"},
+            {"sku_id": 2, "qty": float("nan"), "notes": None},
+            {"sku_id": 3, "qty": 7.5, "notes": ""},
+        ]
+    )
+    assert append_rows(conn, "t", frame, chunk_size=2) == 3
+    assert append_rows(conn, "t", frame.iloc[0:0]) == 0
+
+    rows = conn.execute("SELECT sku_id, qty, notes FROM t ORDER BY id").fetchall()
+    assert rows == [(1, 5.0, "a"), (2, None, None), (3, 7.5, "")]
+    assert [type(r[0]) for r in rows] == [int, int, int]
+
+
 def test_export_import_and_purge(tmp_path):
     db_path = tmp_path / "planner.db"
     db.DB_PATH = db_path
@@ -357,6 +377,19 @@ def test_map_demand_rows_to_sku_id_with_supplier_code(tmp_path):
     assert int(merged.loc[0, "sku_id"]) == 2
 
 
+def test_map_demand_rows_reports_duplicate_catalog_keys_without_row_fanout():
+    catalog = pd.DataFrame(
+        [
+            {"sku_id": 1, "part_number": "PN1", "supplier_code": "S1"},
+            {"sku_id": 2, "part_number": "PN1", "supplier_code": "S1"},
+        ]
+    )
+    imported = pd.DataFrame([{"part_number": "PN1", "supplier_code": "S1", "qty": 10, "need_date": "2026-01-01"}])
+    merged, errors = db.map_import_demand_rows(imported, catalog)
+    assert len(merged) == 1
+    assert any("duplicate" in e for e in errors)
+
+
 def test_pack_rounding_uses_default_or_override_pack_rule(tmp_path):
     db.DB_PATH = tmp_path / "planner.db"
     run_migrations()
@@ -655,3 +688,49 @@ def test_clear_all_saved_data_removes_master_and_demand_rows(tmp_path):
     assert conn.execute("SELECT COUNT(*) FROM sku_master").fetchone()[0] == 0
     assert conn.execute("SELECT COUNT(*) FROM packaging_rules").fetchone()[0] == 0
     assert conn.execute("SELECT COUNT(*) FROM demand_lines").fetchone()[0] == 0
+
+
+def test_ensure_migrated_runs_once_per_db_and_again_if_file_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "planner.db")
+    monkeypatch.setattr(db, "_MIGRATED_DB_PATHS", set())
+    calls = []
+    real_run_migrations = db.run_migrations
+
+    def counting_run_migrations():
+        calls.append(1)
+        real_run_migrations()
+
+    monkeypatch.setattr(db, "run_migrations", counting_run_migrations)
+
+    db.ensure_migrated()
+    db.ensure_migrated()
+    assert len(calls) == 1
+
+    db.DB_PATH.unlink()
+    db.ensure_migrated()
+    assert len(calls) == 2
+    conn = db.get_conn()
+    try:
+        assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sku_master'").fetchone()
+    finally:
+        conn.close()
+
+
+def test_read_conn_applies_planning_pragmas_but_get_conn_keeps_defaults(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "planner.db")
+
+    read_conn = db.get_read_conn()
+    try:
+        assert read_conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        assert read_conn.execute("PRAGMA cache_size").fetchone()[0] == -20000
+        assert read_conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+        assert read_conn.execute("PRAGMA mmap_size").fetchone()[0] == 268435456
+    finally:
+        read_conn.close()
+
+    conn = db.get_conn()
+    try:
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 0
+        assert conn.execute("PRAGMA mmap_size").fetchone()[0] == 0
+    finally:
+        conn.close()
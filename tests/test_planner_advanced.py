@@ -1,6 +1,6 @@
 from datetime import date
 
-from planner import customs_report, phase_cost_rollup, recommend_modes
+from planner import build_shipments, customs_report, phase_cost_rollup, recommend_modes
 from models import Equipment, PackagingRule
 
 
@@ -47,3 +47,66 @@ def test_customs_report_duty_calc_and_phase_rollup():
     roll = phase_cost_rollup(shipments, customs)
     assert roll[0]["phase"] == "Trial1"
     assert roll[0]["total_cost"] == 487.5
+
+
+def test_phase_cost_rollup_tracks_arrival_window_per_phase():
+    shipments = [
+        {"phase": "P2", "mode": "OCEAN", "base_cost": 100, "weight_kg": 10, "volume_m3": 1, "arrival_date": "2026-03-05"},
+        {"phase": "P1", "mode": "AIR", "base_cost": 50, "weight_kg": 5, "volume_m3": 0, "arrival_date": ""},
+        {"phase": "P2", "mode": "AIR", "base_cost": 20, "weight_kg": 10, "volume_m3": 1, "arrival_date": "2026-02-01"},
+        {"phase": "P2", "mode": "OCEAN", "base_cost": 30, "weight_kg": 0, "volume_m3": 0, "arrival_date": "2026-04-10"},
+    ]
+    roll = phase_cost_rollup(shipments, [{"phase": "P2", "duty_amount": 50}])
+    assert [r["phase"] for r in roll] == ["P1", "P2"]
+    assert roll[0]["eta_min"] == "" and roll[0]["eta_max"] == ""
+    assert roll[1]["eta_min"] == "2026-02-01"
+    assert roll[1]["eta_max"] == "2026-04-10"
+    assert roll[1]["mode_mix"] == "AIR,OCEAN"
+    assert roll[1]["total_cost"] == 200
+    assert roll[1]["cost_per_kg"] == 10
+
+
+def test_customs_report_matches_rates_by_hts_and_origin():
+    shipments = [
+        {"sku_id": 1, "part_number": "P1", "qty": 10, "unit_price": 10},
+        {"sku_id": 2, "part_number": "P2", "qty": 10, "unit_price": 10, "coo": "VN"},
+    ]
+    skus = [
+        {"sku_id": 1, "part_number": "P1", "default_coo": "CN", "hts_code": "1111"},
+        {"sku_id": 2, "part_number": "P2", "default_coo": "CN", "hts_code": "2222"},
+    ]
+    rates = [
+        {"hts_code": "2222", "country_of_origin": "CN", "effective_from": "2025-01-01", "base_duty_rate": 50, "tariff_rate": 0},
+        {"hts_code": "1111", "country_of_origin": "", "effective_from": "2025-01-01", "base_duty_rate": 10, "tariff_rate": 0},
+        {"hts_code": "2222", "country_of_origin": "VN", "effective_from": "2025-01-01", "base_duty_rate": 20, "tariff_rate": 0},
+    ]
+    customs = customs_report(shipments + shipments, skus, rates, as_of=date(2026, 1, 1))
+    assert [row["duty_amount"] for row in customs] == [10.0, 20.0, 10.0, 20.0]
+    assert customs_report(shipments, skus, [], as_of=date(2026, 1, 1))[0]["duty_amount"] == 0.0
+
+
+def test_customs_report_prefers_latest_covering_rate():
+    shipments = [{"sku_id": 1, "part_number": "P1", "qty": 1, "unit_price": 100}]
+    skus = [{"sku_id": 1, "part_number": "P1", "default_coo": "CN", "hts_code": "1111"}]
+    rates = [
+        {"hts_code": "1111", "country_of_origin": "CN", "effective_from": "2024-01-01", "effective_to": None, "base_duty_rate": 5, "tariff_rate": 0},
+        {"hts_code": "1111", "country_of_origin": "CN", "effective_from": "2025-06-01", "effective_to": None, "base_duty_rate": 7, "tariff_rate": 0},
+        {"hts_code": "1111", "country_of_origin": "CN", "effective_from": "2027-01-01", "effective_to": None, "base_duty_rate": 9, "tariff_rate": 0},
+    ]
+    customs = customs_report(shipments, skus, rates, as_of=date(2026, 1, 1))
+    assert customs[0]["base_duty_rate"] == 7
+
+
+def test_build_shipments_rolls_up_rows_per_normalized_mode():
+    eq_map = {"Ocean": Equipment("40DV", "OCEAN", 10, 2, 2, 1000, None)}
+    rows = [
+        {"mode": "OCEAN", "volume_m3": 30, "weight_kg": 400, "cost": 100.004, "ship_by": "2026-02-01"},
+        {"mode": "ocean", "volume_m3": 25, "weight_kg": 700, "cost": 50, "ship_by": "2026-01-15"},
+    ]
+    out = build_shipments(rows, eq_map)
+    assert len(out) == 1
+    assert out[0]["mode"] == "OCEAN"
+    assert out[0]["shipments"] == 2
+    assert out[0]["ship_by_date"] == "2026-01-15"
+    assert out[0]["cost"] == 150.0
+    assert out[0]["utilization_pct"] == 68.8
@@ -1,7 +1,7 @@
 from datetime import date
 
 from models import Equipment, PackagingRule
-from planner import allocate_tranches, lead_days_for, norm_mode, recommend_modes
+from planner import allocate_tranches, lead_days_for, norm_mode, normalize_phase_defaults, phase_key, recommend_modes, safe_float, safe_int
 
 
 def test_percent_allocation_uses_original_demand_with_carry_rounding():
@@ -21,6 +21,14 @@ def test_percent_allocation_uses_original_demand_with_carry_rounding():
     assert sum(r.requested_units for r in rows) == 100
 
 
+def test_absolute_tranches_carry_excess_forward():
+    rule = PackagingRule(10, 1, 0, 1, 1, 1, part_number="P1")
+    rows = allocate_tranches(25, rule, [("T1", "units", 25), ("T2", "units", 12)])
+    assert [r.packs for r in rows] == [3, 1]
+    assert [r.requested_units for r in rows] == [25, 7]
+    assert [r.excess_units for r in rows] == [5, 3]
+
+
 def test_lead_override_uses_sku_id_and_normalized_mode():
     lead_table = {("CN", "OCEAN"): 45, ("CN", "AIR"): 7}
     override = {(1, "AIR"): 3}
@@ -105,3 +113,77 @@ def test_recommend_non_air_equipment_name_casing_and_spaces_are_normalized():
     assert rec_clean["mode"] == rec_mixed["mode"]
     assert rec_clean["equipment_count"] == rec_mixed["equipment_count"]
     assert rec_clean["cost_total"] == rec_mixed["cost_total"]
+
+
+def test_recommend_picks_first_listed_rate_between_wildcard_and_specific():
+    eq = {"AIR": [Equipment("AIR_STD", "AIR", 1, 1, 1, 5000, 167)]}
+    rule = PackagingRule(6, 1, 0.5, 0.2, 0.2, 0.2)
+    kwargs = dict(
+        sku_id=1,
+        part_number="P",
+        coo="CN",
+        need_date=date(2026, 1, 15),
+        requested_units=10,
+        pack_rule=rule,
+        equipment_by_mode=eq,
+        lead_table={("CN", "AIR"): 7},
+        sku_lead_override={},
+    )
+    wildcard = {"mode": "AIR", "pricing_model": "per_kg", "rate_value": 1.0, "minimum_charge": 100, "fixed_fee": 0}
+    specific = {"mode": "air", "equipment_name": "air_std", "pricing_model": "PER_KG", "rate_value": 1.0, "minimum_charge": 200, "fixed_fee": 0}
+    other = {"mode": "AIR", "equipment_name": "AIR_BIG", "pricing_model": "per_kg", "rate_value": 1.0, "minimum_charge": 50, "fixed_fee": 0}
+
+    assert recommend_modes(rates=[other, wildcard, specific], **kwargs)[0]["cost_total"] == 100
+    assert recommend_modes(rates=[other, specific, wildcard], **kwargs)[0]["cost_total"] == 200
+
+
+def test_normalize_phase_defaults_keys_rows_by_stripped_phase():
+    rows = [{"phase": " Trial1 ", "default_service_scope": "D2D"}, {"phase": None, "default_service_scope": "P2P"}]
+    cfg = normalize_phase_defaults(rows)
+    assert cfg["Trial1"]["default_service_scope"] == "D2D"
+    assert cfg[phase_key("  Trial1")] is cfg[phase_key(" Trial1 ")]
+    assert phase_key(None) == ""
+    assert cfg[""]["default_service_scope"] == "P2P"
+    assert normalize_phase_defaults([]) == {}
+
+
+def test_safe_numeric_coercion_handles_fast_and_fallback_inputs():
+    assert safe_float(2.5) == 2.5
+    assert safe_float(3) == 3.0 and isinstance(safe_float(3), float)
+    assert safe_float(True) == 1.0
+    assert safe_float("4.25") == 4.25
+    assert safe_float(None, 7.0) == 7.0
+    assert safe_float("n/a", -1.0) == -1.0
+    assert safe_int(5) == 5
+    assert safe_int(5.9) == 5
+    assert safe_int("12") == 12
+    assert safe_int(None, 3) == 3
+    assert safe_int("x", -1) == -1
+
+
+def test_recommend_top_n_matches_head_of_full_ranking():
+    eq = {
+        "AIR": [Equipment("AIR_STD", "AIR", 1, 1, 1, 5000, 167)],
+        "OCEAN": [Equipment("40DV", "OCEAN", 12, 2.3, 2.3, 26000, None)],
+        "TRUCK": [Equipment("TRL_53_STD", "TRUCK", 16, 2.5, 2.7, 20000, None)],
+    }
+    kwargs = dict(
+        sku_id=1,
+        part_number="P",
+        coo="CN",
+        need_date=date(2026, 1, 15),
+        requested_units=10,
+        pack_rule=PackagingRule(6, 1, 0.5, 0.2, 0.2, 0.2),
+        equipment_by_mode=eq,
+        rates=[
+            {"mode": "AIR", "pricing_model": "per_kg", "rate_value": 1.0, "minimum_charge": 100, "fixed_fee": 0},
+            {"mode": "OCEAN", "equipment_name": "40DV", "pricing_model": "per_container", "rate_value": 50, "fixed_fee": 0, "surcharge": 0},
+        ],
+        lead_table={("CN", "AIR"): 7, ("CN", "OCEAN"): 30},
+        sku_lead_override={},
+    )
+    full = recommend_modes(**kwargs)
+    assert [r["mode"] for r in full] == ["OCEAN", "AIR", "TRUCK"]
+    assert recommend_modes(top_n=1, **kwargs) == full[:1]
+    assert recommend_modes(top_n=2, **kwargs) == full[:2]
+    assert recommend_modes(top_n=5, **kwargs) == full
@@ -196,6 +196,9 @@ def test_disallowed_equipment_filtering():
     )
     names = [row["equipment_name"] for row in result["equipment"]]
     assert names == ["40HC_DRY"]
+    row = result["equipment"][0]
+    assert row["cube_util_pct"] == round(row["cube_util"] * 100, 1)
+    assert row["weight_util_pct"] == round(row["weight_util"] * 100, 1)
     excluded_names = {row["equipment_name"] for row in result["excluded_equipment"]}
     assert {"AIR", "DRY_STD"}.issubset(excluded_names)
 
@@ -252,3 +255,77 @@ def test_routing_context_auto_selects_ship_from_dest_and_mode_filters():
     assert routing["selected_origin_code"] == "CNSHA"
     assert routing["selected_dest_code"] == "USLAX_DC01"
     assert routing["incoterm"] == "FOB"
+
+
+def test_legacy_rates_take_cheapest_of_specific_and_wildcard_rows():
+    conn = _setup_min_db()
+    conn.execute("INSERT INTO rates VALUES (2, 'air', NULL, 'flat', 400, NULL, 25, 0)")
+    conn.execute("INSERT INTO rates VALUES (3, 'AIR', 'AIR_BIG', 'flat', 10, NULL, 0, 0)")
+    conn.execute("INSERT INTO rates VALUES (4, 'OCEAN', NULL, 'flat', 5, NULL, 0, 0)")
+    conn.commit()
+
+    result = plan_quick_run(
+        conn=conn,
+        sku_id=1,
+        required_units=10,
+        need_date="2026-01-10",
+        coo_override=None,
+        pack_rule_id=None,
+        lane_origin_code=None,
+        lane_dest_code=None,
+        service_scope=None,
+        modes=["AIR"],
+    )
+    assert result["equipment"][0]["est_cost"] == 425
+    assert result["mode_summary"][0]["cost_best"] == 425
+
+
+def test_rate_card_match_prices_equipment_and_names_carrier():
+    conn = _setup_min_db()
+    conn.execute("INSERT INTO carrier VALUES (7, 'ACME', 'Acme Air')")
+    conn.execute(
+        "INSERT INTO rate_card VALUES (1, 7, 'AIR', 'p2p', 'air_std', 'PORT', 'CNSHA', 'PORT', 'USLAX', 'FLAT', 300, NULL, '2025-01-01', NULL, 1, 0)"
+    )
+    conn.execute(
+        "INSERT INTO rate_card VALUES (2, 7, 'OCEAN', 'p2p', 'x', 'PORT', 'CNSHA', 'PORT', 'USLAX', 'FLAT', 1, NULL, '2025-01-01', NULL, 0, 0)"
+    )
+    conn.execute("INSERT INTO rate_charge VALUES (1, 1, 'DOC', 'Docs', 'FLAT', 25, 'ALWAYS')")
+    conn.execute("INSERT INTO rate_charge VALUES (2, 2, 'DOC', 'Docs', 'FLAT', 99, 'ALWAYS')")
+    conn.commit()
+
+    result = plan_quick_run(
+        conn=conn,
+        sku_id=1,
+        required_units=10,
+        need_date="2026-01-10",
+        coo_override=None,
+        pack_rule_id=None,
+        lane_origin_code="CNSHA",
+        lane_dest_code="USLAX",
+        service_scope="P2P",
+        modes=["AIR"],
+    )
+    row = result["equipment"][0]
+    assert row["est_cost"] == 325
+    assert row["carrier_best"] == "ACME"
+    assert result["rate_breakdown"]["AIR"][0]["rate_card_id"] == 1
+
+
+def test_unknown_truck_config_falls_back_to_default_with_warning():
+    conn = _setup_min_db()
+    kwargs = dict(
+        conn=conn,
+        sku_id=1,
+        required_units=10,
+        need_date="2026-01-10",
+        coo_override=None,
+        pack_rule_id=None,
+        lane_origin_code=None,
+        lane_dest_code=None,
+        service_scope=None,
+        modes=["AIR"],
+    )
+    assert plan_quick_run(**kwargs, truck_config_code="5AXLE_TL")["warnings"] == []
+    result = plan_quick_run(**kwargs, truck_config_code="NOPE", jurisdiction_code="NOPE")
+    assert result["warnings"] == ["Truck config missing; using conservative default 5AXLE_TL assumptions."]
+    assert result["equipment"]
@@ -1,6 +1,6 @@
 from datetime import date
 
-from rate_engine import RateTestInput, compute_rate_total, select_best_rate_card
+from rate_engine import RateTestInput, compute_rate_total, index_charges, index_rate_cards, select_best_rate_card, shipment_lane_key
 
 
 def test_select_best_rate_card_prefers_priority_then_latest_effective():
@@ -53,6 +53,43 @@ def test_select_best_rate_card_prefers_priority_then_latest_effective():
     assert best["id"] == 2
 
 
+def test_indexed_rate_cards_select_same_card_as_full_scan():
+    shipment = RateTestInput(
+        ship_date=date(2026, 1, 15),
+        mode="ocean",
+        equipment="40DV",
+        service_scope="P2P",
+        origin_type="PORT",
+        origin_code="uslax",
+        dest_type="PORT",
+        dest_code="CNSHA",
+    )
+    lane = {
+        "mode": "OCEAN",
+        "equipment": "40dv",
+        "service_scope": "P2P",
+        "origin_type": "PORT",
+        "origin_code": "USLAX",
+        "dest_type": "PORT",
+        "dest_code": "CNSHA",
+        "effective_from": "2025-01-01",
+        "effective_to": None,
+        "priority": 1,
+    }
+    cards = [
+        {**lane, "id": 1, "is_active": 1},
+        {**lane, "id": 2, "is_active": 0, "priority": 9},
+        {**lane, "id": 3, "is_active": 1, "dest_code": "JPTYO", "priority": 9},
+        {**lane, "id": 4, "is_active": 1},
+    ]
+
+    index = index_rate_cards(cards)
+    bucket = index.get(shipment_lane_key(shipment), [])
+    assert [c["id"] for c in bucket] == [1, 4]
+    assert select_best_rate_card(bucket, shipment) is select_best_rate_card(cards, shipment)
+    assert select_best_rate_card(bucket, shipment)["id"] == 1
+
+
 def test_compute_rate_total_with_accessorials_and_bounds():
     shipment = RateTestInput(
         ship_date=date(2026, 1, 15),
@@ -108,3 +145,50 @@ def test_compute_rate_total_with_accessorials_and_bounds():
     assert result["charges_total"] == 150
     assert result["grand_total"] == 450
     assert len(result["items"]) == 3
+
+
+def test_charge_flags_apply_only_to_matching_shipments():
+    shipment = RateTestInput(
+        ship_date=date(2026, 1, 15),
+        mode="OCEAN",
+        equipment="40DV",
+        service_scope="P2P",
+        origin_type="PORT",
+        origin_code="USLAX",
+        dest_type="PORT",
+        dest_code="CNSHA",
+        dg=True,
+    )
+    card = {"id": 10, "currency": "USD", "base_rate": 0, "uom_pricing": "FLAT", "min_charge": None}
+    charges = [
+        {"rate_card_id": 10, "charge_code": code, "calc_method": "FLAT", "amount": 1, "applies_when": flag}
+        for code, flag in [("ALL", None), ("DG", " dg_only "), ("FR", "FLATRACK_ONLY"), ("OH", "OH_ONLY"), ("X", "BOGUS")]
+    ]
+
+    result = compute_rate_total(card, charges, shipment)
+
+    assert [item["code"] for item in result["items"]] == ["BASE", "ALL", "DG"]
+
+
+def test_indexed_charges_price_same_as_full_list():
+    shipment = RateTestInput(
+        ship_date=date(2026, 1, 15),
+        mode="OCEAN",
+        equipment="40DV",
+        service_scope="P2P",
+        origin_type="PORT",
+        origin_code="USLAX",
+        dest_type="PORT",
+        dest_code="CNSHA",
+        containers_count=2,
+    )
+    card = {"id": 10, "currency": "USD", "base_rate": 100, "uom_pricing": "PER_CONTAINER", "min_charge": None}
+    charges = [
+        {"rate_card_id": card_id, "charge_code": code, "calc_method": "FLAT", "amount": amount, "applies_when": "ALWAYS"}
+        for card_id, code, amount in [(10, "DOC", 50), (11, "OTHER", 999), (10, "SEAL", 5), (None, "ORPHAN", 1)]
+    ]
+
+    by_card = index_charges(charges)
+
+    assert [c["charge_code"] for c in by_card[10]] == ["DOC", "SEAL"]
+    assert compute_rate_total(card, by_card.get(10, []), shipment) == compute_rate_total(card, charges, shipment)